@@ -0,0 +1,69 @@
+import threading
+from bisect import bisect_left
+
+from recipes.models import Ingredient
+
+from .cache import get_reference_version
+
+
+class IngredientIndex:
+    """Отсортированный индекс названий ингредиентов в памяти процесса.
+
+    Сначала возвращаются ингредиенты, название которых начинается
+    с запроса (поиск бинарный), затем те, где запрос встречается
+    внутри названия. Индекс строится при первом обращении
+    и перестраивается, когда меняется версия справочника
+    ингредиентов в кэше (её увеличивают сигналы).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def build(self):
+        version = get_reference_version(Ingredient)
+        entries = sorted(
+            (name.lower(), pk, name, measurement_unit)
+            for pk, name, measurement_unit
+            in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit').iterator()
+        )
+        keys = [entry[0] for entry in entries]
+        self._snapshot = (version, keys, entries)
+        return self._snapshot
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def get_snapshot(self):
+        snapshot = self._snapshot
+        version = get_reference_version(Ingredient)
+        if snapshot is None or snapshot[0] != version:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None or snapshot[0] != version:
+                    snapshot = self.build()
+        return snapshot
+
+    def search(self, query, limit=None):
+        _, keys, entries = self.get_snapshot()
+        query = query.lower()
+        found = []
+        position = bisect_left(keys, query)
+        while (position < len(keys) and keys[position].startswith(query)
+               and (limit is None or len(found) < limit)):
+            found.append(entries[position])
+            position += 1
+        if limit is None or len(found) < limit:
+            for entry in entries:
+                if query in entry[0] and not entry[0].startswith(query):
+                    found.append(entry)
+                    if limit is not None and len(found) >= limit:
+                        break
+        return [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for _, pk, name, measurement_unit in found
+        ]
+
+
+ingredient_index = IngredientIndex()
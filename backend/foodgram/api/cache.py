@@ -0,0 +1,91 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, urlencode
+from rest_framework.renderers import JSONRenderer
+
+
+def get_cache():
+    return caches[settings.REFERENCE_CACHE_ALIAS]
+
+
+def version_key(model):
+    return f'reference_version:{model._meta.label_lower}'
+
+
+def get_reference_version(model):
+    """Версия справочника - время его последнего изменения.
+    Если версии в кэше нет, она создаётся заново."""
+    cache = get_cache()
+    version = cache.get(version_key(model))
+    if version is None:
+        cache.add(version_key(model), time.time(), timeout=None)
+        version = cache.get(version_key(model))
+    return version
+
+
+def bump_reference_version(model):
+    """Меняет версию справочника после фиксации транзакции: иначе
+    параллельный запрос успел бы закэшировать старые данные
+    под новой версией."""
+    transaction.on_commit(lambda: get_cache().set(
+        version_key(model), time.time(), timeout=None))
+
+
+def reference_key(model, version, request, params):
+    """Ключ кэша из пути и параметров params, от которых зависит ответ.
+    Значения приводятся к нижнему регистру, остальные параметры
+    не учитываются, чтобы произвольные запросы не плодили записи."""
+    query = urlencode(sorted(
+        (name, value.lower())
+        for name in params
+        for value in request.query_params.getlist(name)
+    ))
+    digest = hashlib.md5(f'{request.path}?{query}'.encode()).hexdigest()
+    return f'reference:{model._meta.label_lower}:{version}:{digest}'
+
+
+def cached_reference(model, params=()):
+    """Кэширует готовый JSON ответа действия справочного эндпоинта.
+
+    Ключ кэша включает версию справочника, поэтому после изменения
+    модели (см. сигналы) старые записи просто перестают читаться.
+    В ключ входят только параметры запроса params без учёта регистра.
+    Версии и ответы должны быть общими для всех процессов, поэтому
+    REFERENCE_CACHE_ALIAS должен указывать на общий кэш (memcached,
+    Redis), а не на LocMemCache (см. проверку api.W001).
+    Ответы содержат ETag и Last-Modified, повторный запрос
+    с If-None-Match/If-Modified-Since получает 304 Not Modified.
+    """
+    def decorator(action):
+        @wraps(action)
+        def wrapper(self, request, *args, **kwargs):
+            if not isinstance(request.accepted_renderer, JSONRenderer):
+                return action(self, request, *args, **kwargs)
+            cache = get_cache()
+            version = get_reference_version(model)
+            key = reference_key(model, version, request, params)
+            entry = cache.get(key)
+            if entry is None:
+                response = action(self, request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                content = JSONRenderer().render(response.data)
+                entry = (content, f'"{hashlib.md5(content).hexdigest()}"')
+                cache.set(key, entry, settings.REFERENCE_CACHE_TIMEOUT)
+            content, etag = entry
+            response = HttpResponse(content, content_type='application/json')
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(version)
+            response['Cache-Control'] = 'no-cache'
+            return get_conditional_response(
+                request, etag=etag, last_modified=int(version),
+                response=response)
+        return wrapper
+    return decorator
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+LOCMEM_BACKEND = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """Версии справочников и кэш их ответов должны быть общими
+    для всех процессов."""
+    backend = settings.CACHES[settings.REFERENCE_CACHE_ALIAS]['BACKEND']
+    if settings.DEBUG or backend != LOCMEM_BACKEND:
+        return []
+    return [Warning(
+        'Кэш REFERENCE_CACHE_ALIAS хранится в памяти процесса: '
+        'изменения справочников не будут видны другим процессам.',
+        hint='Укажите общий кэш в CACHE_BACKEND и CACHE_LOCATION, '
+             'например memcached.',
+        id='api.W001',
+    )]
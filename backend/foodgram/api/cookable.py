@@ -0,0 +1,162 @@
+import heapq
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import chain
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+from recipes.models import RecipeIngredient, RecipeIngredientChange
+
+
+def group_ingredients(rows):
+    """{recipe_id: (ingredient_id, ...)} из пар (recipe_id, ingredient_id)."""
+    recipes = defaultdict(set)
+    for recipe_id, ingredient_id in rows:
+        recipes[recipe_id].add(ingredient_id)
+    return {recipe_id: tuple(sorted(ingredients))
+            for recipe_id, ingredients in recipes.items()}
+
+
+def get_sequence():
+    """Номер последней записи журнала изменений составов."""
+    return RecipeIngredientChange.objects.aggregate(
+        sequence=Max('id'))['sequence'] or 0
+
+
+def mark_changed(recipe_ids):
+    """Записывает в журнал в базе рецепты, у которых изменился
+    состав (или которые удалены). Индексы во всех процессах
+    подхватят их при следующем запросе."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    RecipeIngredientChange.objects.bulk_create(
+        RecipeIngredientChange(recipe_id=pk) for pk in recipe_ids)
+    # Более старые записи не нужны: индекс, отставший на столько
+    # изменений, всё равно строится заново
+    RecipeIngredientChange.objects.filter(
+        id__lte=get_sequence() - settings.COOKABLE_INDEX_MAX_CHANGES
+    ).delete()
+
+
+class CookableIndex:
+    """Инвертированный индекс ингредиент -> рецепты в памяти процесса.
+
+    Для каждого ингредиента хранится отсортированный массив id рецептов,
+    для каждого рецепта — его ингредиенты. Поиск по набору имеющихся
+    ингредиентов считает, сколько ингредиентов каждого рецепта есть
+    у пользователя, не обращаясь к базе. Индекс строится при первом
+    обращении; изменения составов рецептов применяются по журналу
+    RecipeIngredientChange в базе только для изменившихся рецептов,
+    а при слишком большом отставании индекс строится заново.
+    Снимок не меняется на месте, поэтому читается без блокировки.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def build(self):
+        sequence = get_sequence()
+        recipes = group_ingredients(
+            RecipeIngredient.objects.order_by().values_list(
+                'recipe_id', 'ingredient_id').iterator())
+        postings = defaultdict(list)
+        for recipe_id in sorted(recipes):
+            for ingredient_id in recipes[recipe_id]:
+                postings[ingredient_id].append(recipe_id)
+        self._snapshot = (
+            sequence,
+            {ingredient_id: array('q', recipe_ids)
+             for ingredient_id, recipe_ids in postings.items()},
+            recipes,
+        )
+        return self._snapshot
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def refresh(self, snapshot, sequence):
+        """Применяет к снимку изменения из журнала
+        или строит индекс заново, если журнал неполон."""
+        applied, postings, recipes = snapshot
+        if sequence < applied or (
+                sequence - applied > settings.COOKABLE_INDEX_MAX_CHANGES):
+            return self.build()
+        changes = list(RecipeIngredientChange.objects.filter(
+            id__gt=applied, id__lte=sequence
+        ).values_list('id', 'recipe_id', 'created'))
+        changed = {recipe_id for _, recipe_id, _ in changes}
+        # Запись с меньшим номером может быть ещё не зафиксирована:
+        # снимок считается применённым только до пропуска, и записи
+        # после него будут прочитаны ещё раз. Пропуск перед записью
+        # старше COOKABLE_INDEX_GAP_TIMEOUT секунд не заполнится
+        # (откат или сбой), его ждать не нужно
+        deadline = timezone.now() - timedelta(
+            seconds=settings.COOKABLE_INDEX_GAP_TIMEOUT)
+        for number, _, created in changes:
+            if number != applied + 1 and created > deadline:
+                break
+            applied = number
+        current = group_ingredients(
+            RecipeIngredient.objects.filter(
+                recipe_id__in=changed
+            ).order_by().values_list('recipe_id', 'ingredient_id'))
+        postings = dict(postings)
+        recipes = dict(recipes)
+        copied = set()
+        for recipe_id in changed:
+            old = set(recipes.pop(recipe_id, ()))
+            new = set(current.get(recipe_id, ()))
+            for ingredient_id in old ^ new:
+                if ingredient_id not in copied:
+                    postings[ingredient_id] = array(
+                        'q', postings.get(ingredient_id, ()))
+                    copied.add(ingredient_id)
+                recipe_ids = postings[ingredient_id]
+                if ingredient_id in new:
+                    insort(recipe_ids, recipe_id)
+                    continue
+                del recipe_ids[bisect_left(recipe_ids, recipe_id)]
+                if not recipe_ids:
+                    del postings[ingredient_id]
+                    copied.discard(ingredient_id)
+            if new:
+                recipes[recipe_id] = current[recipe_id]
+        self._snapshot = (applied, postings, recipes)
+        return self._snapshot
+
+    def get_snapshot(self):
+        snapshot = self._snapshot
+        sequence = get_sequence()
+        if snapshot is None or snapshot[0] != sequence:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None:
+                    snapshot = self.build()
+                elif snapshot[0] != sequence:
+                    snapshot = self.refresh(snapshot, sequence)
+        return snapshot
+
+    def search(self, ingredient_ids, limit):
+        """Не больше limit рецептов, в которых есть хотя бы один из
+        ingredient_ids: [(recipe_id, coverage), ...], где coverage —
+        доля ингредиентов рецепта, которые есть у пользователя.
+        Сначала полностью покрытые, затем с большим числом совпадений
+        и более новые."""
+        _, postings, recipes = self.get_snapshot()
+        matched = Counter(chain.from_iterable(
+            postings.get(ingredient_id, ())
+            for ingredient_id in set(ingredient_ids)))
+        best = heapq.nlargest(
+            limit,
+            ((count / len(recipes[recipe_id]), count, recipe_id)
+             for recipe_id, count in matched.items()))
+        return [(recipe_id, coverage) for coverage, _, recipe_id in best]
+
+
+cookable_index = CookableIndex()
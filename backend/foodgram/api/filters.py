@@ -1,37 +1,100 @@
 import django_filters
+from django.db.models import BooleanField, Case, Exists, OuterRef, Value, When
 from recipes.models import Ingredient, Recipe
 
+USER_FLAG_CHOICES = (('0', '0'), ('1', '1'))
+
+TAGS_ANY = 'any'
+TAGS_ALL = 'all'
+
+RECIPE_ORDERINGS = {
+    'popular': ('-favorites_count', '-id'),
+    'trending': ('-trending_score', '-id'),
+    'cooking_time': ('cooking_time', 'id'),
+}
+
 
 class RecipeFilter(django_filters.FilterSet):
     tags = django_filters.CharFilter(
         field_name='tags__slug', method='filter_tags'
     )
-    is_favorited = django_filters.NumberFilter(
-        field_name='is_favorited', method='filter_is_favorited')
-    is_in_shopping_cart = django_filters.NumberFilter(
-        field_name='is_in_shopping_cart', method='filter_is_in_shopping_cart')
+    tags_mode = django_filters.ChoiceFilter(
+        choices=((TAGS_ANY, TAGS_ANY), (TAGS_ALL, TAGS_ALL)),
+        method='filter_tags_mode'
+    )
+    is_favorited = django_filters.ChoiceFilter(
+        choices=USER_FLAG_CHOICES,
+        field_name='is_favorited', method='filter_user_flag')
+    is_in_shopping_cart = django_filters.ChoiceFilter(
+        choices=USER_FLAG_CHOICES,
+        field_name='is_in_shopping_cart', method='filter_user_flag')
+    search = django_filters.CharFilter(method='filter_search')
+    ordering = django_filters.ChoiceFilter(
+        choices=[(name, name) for name in RECIPE_ORDERINGS],
+        method='filter_ordering'
+    )
 
-    def filter_is_favorited(self, queryset, name, value):
-        if self.request.user.is_authenticated:
-            return queryset.filter(favors__user=self.request.user)
+    def filter_user_flag(self, queryset, name, value):
+        """1 — только рецепты в избранном (списке покупок) пользователя,
+        0 — все остальные. Фильтр использует аннотацию with_user_flags:
+        условие становится (NOT) EXISTS по уникальному индексу
+        (user_id, recipe_id) без соединения и размножения строк.
+        У анонимного пользователя отмеченных рецептов нет."""
+        flag = value == '1'
+        if not self.request.user.is_authenticated:
+            return queryset.none() if flag else queryset
+        return queryset.filter(**{name: flag})
 
-    def filter_is_in_shopping_cart(self, queryset, name, value):
-        if self.request.user.is_authenticated:
-            return queryset.filter(
-                shopping_cart__user=self.request.user)
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск, самые релевантные рецепты первыми.
+        Явная сортировка ?ordering= применяется после него. Порядок
+        по релевантности не поддерживает ?cursor= (ответ 400)."""
+        return queryset.search(value).order_by(
+            '-search_rank', '-pub_date', '-id')
+
+    def filter_ordering(self, queryset, name, value):
+        """Сортировки по предрассчитанным индексируемым полям."""
+        return queryset.order_by(*RECIPE_ORDERINGS[value])
 
     def filter_tags(self, queryset, name, value):
-        tags_list = self.request.GET.getlist('tags')
-        return queryset.filter(tags__slug__in=tags_list).distinct()
+        """Рецепты с любым из тэгов ?tags= или, при ?tags_mode=all,
+        со всеми сразу. Условие проверяется подзапросами EXISTS
+        к таблице связи, поэтому строки рецептов не размножаются
+        соединением и DISTINCT не нужен."""
+        slugs = set(self.request.GET.getlist('tags'))
+        recipe_tags = Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'))
+        if self.form.cleaned_data.get('tags_mode') != TAGS_ALL:
+            return queryset.filter(
+                Exists(recipe_tags.filter(tag__slug__in=slugs)))
+        for slug in slugs:
+            queryset = queryset.filter(
+                Exists(recipe_tags.filter(tag__slug=slug)))
+        return queryset
+
+    def filter_tags_mode(self, queryset, name, value):
+        """Режим учитывается в filter_tags."""
+        return queryset
 
     class Meta:
         model = Recipe
-        fields = ['author', 'tags', 'is_favorited', 'is_in_shopping_cart']
+        fields = ['author', 'tags', 'tags_mode', 'is_favorited',
+                  'is_in_shopping_cart', 'search', 'ordering']
 
 
 class IngredientFilter(django_filters.FilterSet):
-    """Поиск по названию ингредиента."""
-    name = django_filters.CharFilter(lookup_expr='istartswith')
+    """Поиск по названию ингредиента: сначала совпадения
+    с начала названия, затем вхождения внутри него."""
+    name = django_filters.CharFilter(method='filter_name')
+
+    def filter_name(self, queryset, name, value):
+        return queryset.filter(name__icontains=value).annotate(
+            is_prefix=Case(
+                When(name__istartswith=value, then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField()
+            )
+        ).order_by('-is_prefix', 'name')
 
     class Meta:
         model = Ingredient
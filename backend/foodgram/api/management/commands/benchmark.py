@@ -0,0 +1,278 @@
+import statistics
+import time
+
+from api import views
+from api.cookable import cookable_index
+from api.serializers import ListRecipeSerializer
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, F, FloatField, Q
+from django.db.models.functions import Cast
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from recipes.models import (Favourite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, ShoppingCartIngredient, Tag)
+from rest_framework.test import APIRequestFactory, force_authenticate
+from user.models import User
+
+INGREDIENTS_PER_RECIPE = 10
+INGREDIENTS_TOTAL = 200
+
+
+class Command(BaseCommand):
+    help = ('Замеряет время ответа эндпоинтов на синтетических данных. '
+            'Все данные создаются в транзакции и откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', choices=sorted(SCENARIOS))
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Количество замеров для каждого размера данных')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            SCENARIOS[options['scenario']](self, options['repeat'])
+            transaction.set_rollback(True)
+
+    def report(self, label, timings, queries):
+        self.stdout.write(
+            f'{label:>30}: median {statistics.median(timings) * 1000:9.2f} ms'
+            f', min {min(timings) * 1000:9.2f} ms, queries {queries}')
+
+
+def measure(func, repeat):
+    """Возвращает время каждого из repeat вызовов
+    и количество запросов к БД за один вызов."""
+    timings = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+    return timings, len(context.captured_queries)
+
+
+def create_user(username):
+    return User.objects.create(username=username, email=f'{username}@ai.ru')
+
+
+def create_ingredients(count=INGREDIENTS_TOTAL):
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f'benchmark {i}', measurement_unit='г')
+        for i in range(count)
+    )
+    return list(Ingredient.objects.filter(name__startswith='benchmark '))
+
+
+def create_recipes(author, count, ingredients,
+                   per_recipe=INGREDIENTS_PER_RECIPE):
+    first = Recipe.objects.count()
+    Recipe.objects.bulk_create(
+        Recipe(author=author, name=f'benchmark {first + i}',
+               text='benchmark', cooking_time=10)
+        for i in range(count)
+    )
+    recipes = list(Recipe.objects.filter(author=author).order_by('-id')
+                   [:count])
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(
+            recipe=recipe,
+            ingredient=ingredients[(i + j) % len(ingredients)],
+            amount=j + 1)
+        for i, recipe in enumerate(recipes)
+        for j in range(per_recipe)
+    )
+    return recipes
+
+
+def call_view(view, user, path, **kwargs):
+    request = APIRequestFactory().get(
+        path, HTTP_HOST=settings.ALLOWED_HOSTS[0])
+    force_authenticate(request, user=user)
+    response = view(request, **kwargs)
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    if hasattr(response, 'render'):
+        response.render()
+    return response.content
+
+
+def shopping_cart(command, repeat):
+    """Скачивание списка покупок для корзин разного размера."""
+    author = create_user('benchmark_author')
+    ingredients = create_ingredients()
+    view = views.GetShoppingCartView.as_view({'get': 'list'})
+    for size in (10, 100, 1000):
+        user = create_user(f'benchmark_cart_{size}')
+        recipes = create_recipes(author, size, ingredients)
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=user, recipe=recipe) for recipe in recipes)
+        ShoppingCartIngredient.objects.apply_recipes(
+            [recipe.pk for recipe in recipes], user_id=user.pk)
+        timings, queries = measure(
+            lambda: call_view(
+                view, user, '/api/recipes/download_shopping_cart/'),
+            repeat)
+        command.report(f'{size} recipes in cart', timings, queries)
+
+
+def serialize_recipe_page(command, repeat):
+    """Сериализация страницы из 100 рецептов с тэгами без обращений к БД."""
+    author = create_user('benchmark_author')
+    tags = [Tag.objects.create(name=f'benchmark {i}', slug=f'benchmark_{i}',
+                               color=f'#00000{i}')
+            for i in range(3)]
+    recipes = create_recipes(author, 100, create_ingredients())
+    for recipe in recipes:
+        recipe.tags.set(tags)
+    request = APIRequestFactory().get('/api/recipes/')
+    request.user = author
+    page = list(Recipe.objects.filter(author=author).with_related()
+                .with_user_flags(author))
+    timings, queries = measure(
+        lambda: ListRecipeSerializer(page, many=True, context={
+            'request': request, 'tag_representations': {}}).data,
+        repeat)
+    command.report('100 recipes page', timings, queries)
+
+
+def update_recipe(command, repeat):
+    """Изменение количества одного ингредиента в рецептах
+    разного размера, который лежит в 100 корзинах."""
+    author = create_user('benchmark_author')
+    ingredients = create_ingredients()
+    tags = [Tag.objects.create(name=f'benchmark {i}', slug=f'benchmark_{i}',
+                               color=f'#00000{i}')
+            for i in range(3)]
+    readers = [create_user(f'benchmark_reader_{i}') for i in range(100)]
+    view = views.RecipeView.as_view({'patch': 'partial_update'})
+    for size in (10, 50, 200):
+        recipe, = create_recipes(author, 1, ingredients, per_recipe=size)
+        recipe.tags.set(tags)
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=reader, recipe=recipe) for reader in readers)
+        ShoppingCartIngredient.objects.apply_recipes([recipe.pk])
+        rows = list(recipe.recipe_ingredients.order_by('id'))
+        edits = iter(range(1, repeat + 1))
+
+        def edit():
+            amounts = [row.amount for row in rows]
+            amounts[0] += next(edits)
+            request = APIRequestFactory().patch(
+                f'/api/recipes/{recipe.pk}/',
+                {'tags': [tag.pk for tag in tags],
+                 'ingredients': [
+                     {'id': row.ingredient_id, 'amount': amount}
+                     for row, amount in zip(rows, amounts)]},
+                format='json')
+            force_authenticate(request, user=author)
+            view(request, pk=recipe.pk).render()
+
+        timings, queries = measure(edit, repeat)
+        command.report(f'{size} ingredients', timings, queries)
+
+
+def cookable(command, repeat):
+    """Поиск 100 лучших рецептов по 10 имеющимся ингредиентам:
+    агрегирующим запросом к БД и по индексу в памяти."""
+    author = create_user('benchmark_author')
+    ingredients = create_ingredients()
+    available = [ingredient.pk for ingredient in ingredients[::20]]
+    for size in (10000, 50000):
+        create_recipes(author, size - Recipe.objects.count(), ingredients)
+        timings, queries = measure(
+            lambda: list(Recipe.objects.annotate(
+                total=Count('recipe_ingredients'),
+                matched=Count('recipe_ingredients', filter=Q(
+                    recipe_ingredients__ingredient__in=available)),
+            ).filter(matched__gt=0).annotate(
+                coverage=Cast('matched', FloatField()) / F('total')
+            ).order_by('-coverage', '-matched', '-id').values_list(
+                'id', flat=True)[:100]),
+            repeat)
+        command.report(f'{size} recipes, SQL', timings, queries)
+        cookable_index.invalidate()
+        timings, queries = measure(
+            lambda: cookable_index.search(available, 100), repeat)
+        command.report(f'{size} recipes, index', timings[1:], queries)
+
+
+def tag_filter(command, repeat):
+    """Первая страница ленты с фильтром по двум из трёх тэгов
+    в режимах any и all."""
+    author = create_user('benchmark_author')
+    ingredients = create_ingredients()
+    tags = [Tag.objects.create(name=f'benchmark {i}', slug=f'benchmark_{i}',
+                               color=f'#00000{i}')
+            for i in range(3)]
+    through = Recipe.tags.through
+    view = views.RecipeView.as_view({'get': 'list'})
+    for size in (10000, 50000):
+        recipes = create_recipes(
+            author, size - Recipe.objects.count(), ingredients,
+            per_recipe=1)
+        through.objects.bulk_create(
+            through(recipe=recipe, tag=tag)
+            for i, recipe in enumerate(recipes)
+            for tag in tags[:i % 3 + 1]
+        )
+        for mode in ('any', 'all'):
+            timings, queries = measure(
+                lambda: call_view(
+                    view, author, '/api/recipes/?tags=benchmark_1'
+                    f'&tags=benchmark_2&tags_mode={mode}&limit=10'),
+                repeat)
+            command.report(f'{size} recipes, {mode}', timings, queries)
+
+
+def add_favourites(users, share):
+    """Каждый пользователь добавляет в избранное каждый share-й рецепт;
+    строки создаются одним INSERT ... SELECT."""
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(Favourite._meta.db_table)} '
+            f'(user_id, recipe_id, pub_date) '
+            f'SELECT u.id, r.id, %s '
+            f'FROM {quote(User._meta.db_table)} u '
+            f'CROSS JOIN {quote(Recipe._meta.db_table)} r '
+            f'WHERE u.id IN ({", ".join(["%s"] * len(users))}) '
+            f'AND (r.id + u.id) %% %s = 0',
+            (timezone.now(), *(user.pk for user in users), share)
+        )
+
+
+def favorited_filter(command, repeat):
+    """Первая страница ленты с ?is_favorited=1 и 0 при 100 тысячах
+    и 1 миллионе строк избранного (10 тысяч рецептов, у каждого
+    пользователя в избранном каждый десятый)."""
+    author = create_user('benchmark_author')
+    create_recipes(author, 10000, create_ingredients(), per_recipe=1)
+    view = views.RecipeView.as_view({'get': 'list'})
+    users = []
+    for count in (100, 1000):
+        new_users = [create_user(f'benchmark_reader_{i}')
+                     for i in range(len(users), count)]
+        add_favourites(new_users, 10)
+        users += new_users
+        size = Favourite.objects.count()
+        for value in (1, 0):
+            timings, queries = measure(
+                lambda: call_view(
+                    view, users[0],
+                    f'/api/recipes/?is_favorited={value}&limit=10'),
+                repeat)
+            command.report(
+                f'{size} favourites, is_favorited={value}',
+                timings, queries)
+
+
+SCENARIOS = {
+    'cookable': cookable,
+    'favorited_filter': favorited_filter,
+    'serialize_recipe_page': serialize_recipe_page,
+    'shopping_cart': shopping_cart,
+    'tag_filter': tag_filter,
+    'update_recipe': update_recipe,
+}
@@ -0,0 +1,90 @@
+from django.db import connection
+from django.http import Http404
+from django.utils import timezone
+from recipes.models import Recipe
+
+ADDED = 'added'
+REMOVED = 'removed'
+ALREADY_ADDED = 'already_added'
+NOT_ADDED = 'not_added'
+NOT_FOUND = 'not_found'
+
+
+class UserRecipeRelationMixin:
+    """Добавление и удаление рецептов в избранное или корзину
+    текущего пользователя одним запросом к БД на любое число рецептов.
+
+    Повторное добавление не создаёт дубликат: вставка выполняется
+    через INSERT ... ON CONFLICT DO NOTHING по уникальному ограничению
+    (user, recipe), поэтому параллельные запросы безопасны. RETURNING
+    сообщает, какие именно рецепты были добавлены или удалены.
+    """
+
+    def get_recipe_id(self):
+        try:
+            return int(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except (TypeError, ValueError):
+            raise Http404
+
+    def add_relations(self, model, recipe_ids):
+        """Добавляет связи с рецептами, возвращает {id: статус}."""
+        quote = connection.ops.quote_name
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {quote(model._meta.db_table)} '
+                f'(user_id, recipe_id, pub_date) '
+                f'SELECT %s, id, %s FROM {quote(Recipe._meta.db_table)} '
+                f'WHERE id IN ({placeholders}) '
+                f'ON CONFLICT (user_id, recipe_id) DO NOTHING '
+                f'RETURNING recipe_id',
+                [self.request.user.pk,
+                 connection.ops.adapt_datetimefield_value(timezone.now()),
+                 *recipe_ids]
+            )
+            added = {row[0] for row in cursor.fetchall()}
+        return self.get_statuses(recipe_ids, added, ADDED, ALREADY_ADDED)
+
+    def remove_relations(self, model, recipe_ids):
+        """Удаляет связи с рецептами, возвращает {id: статус}."""
+        quote = connection.ops.quote_name
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {quote(model._meta.db_table)} '
+                f'WHERE user_id = %s AND recipe_id IN ({placeholders}) '
+                f'RETURNING recipe_id',
+                [self.request.user.pk, *recipe_ids]
+            )
+            removed = {row[0] for row in cursor.fetchall()}
+        return self.get_statuses(recipe_ids, removed, REMOVED, NOT_ADDED)
+
+    def get_statuses(self, recipe_ids, changed, done, unchanged):
+        """Для неизменённых рецептов отдельным запросом, только если
+        такие есть, проверяет, существуют ли они вообще."""
+        rest = [pk for pk in recipe_ids if pk not in changed]
+        existing = set(Recipe.objects.filter(
+            pk__in=rest).values_list('pk', flat=True)) if rest else set()
+        return {
+            pk: done if pk in changed
+            else unchanged if pk in existing else NOT_FOUND
+            for pk in recipe_ids
+        }
+
+    def add_relation(self, model):
+        """Добавляет связь с рецептом из URL. Возвращает False, если
+        она уже была, и отвечает 404, если рецепта не существует."""
+        return self.check_status(
+            self.add_relations(model, [self.get_recipe_id()]), ADDED)
+
+    def remove_relation(self, model):
+        """Удаляет связь с рецептом из URL. Возвращает False,
+        если её не было."""
+        return self.check_status(
+            self.remove_relations(model, [self.get_recipe_id()]), REMOVED)
+
+    def check_status(self, statuses, done):
+        status, = statuses.values()
+        if status == NOT_FOUND:
+            raise Http404
+        return status == done
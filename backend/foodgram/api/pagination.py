@@ -0,0 +1,168 @@
+import base64
+import binascii
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+from recipes.feed import read_feed
+from recipes.models import Recipe
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class LimitPageNumberPagination(PageNumberPagination):
+    """Пагинация по номеру страницы (?page=) с размером страницы,
+    заданным клиентом (?limit=), но не больше MAX_PAGE_SIZE."""
+    page_size_query_param = 'limit'
+    max_page_size = settings.MAX_PAGE_SIZE
+
+
+class RecipePagination(LimitPageNumberPagination):
+    """Пагинация ленты рецептов.
+
+    По умолчанию работает по номерам страниц (?page=). Параметр ?cursor=
+    включает keyset-пагинацию по (pub_date, id) или по полю сортировки
+    ?ordering=: следующая страница выбирается условием по последнему
+    показанному рецепту, а не OFFSET, поэтому не зависит от глубины
+    и от новых рецептов. Общее количество в этом режиме считается
+    только по запросу ?count=exact или ?count=approximate (оценка
+    планировщика PostgreSQL).
+    """
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    ordering = ('-pub_date', '-id')
+    invalid_cursor_message = 'Неверный курсор.'
+    unsupported_ordering_message = (
+        'Курсор нельзя использовать с этой сортировкой, '
+        'например с поиском ?search=.')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        queryset = queryset.order_by(*self.get_ordering(queryset))
+        self.count = self.get_count(queryset, request)
+        position = self.decode_cursor(request)
+        if position is not None:
+            value, pk = position
+            queryset = queryset.filter(self.after(value, pk))
+        results = list(queryset[:page_size + 1])
+        self.next_position = None
+        if len(results) > page_size:
+            results = results[:page_size]
+            self.next_position = (
+                self.cursor_field.value_to_string(results[-1]),
+                results[-1].pk)
+        return results
+
+    def get_ordering(self, queryset):
+        """Порядок вида (поле, id) из фильтра ?ordering= или по умолчанию.
+        Курсор хранит значение поля и id последнего рецепта, поэтому
+        другой порядок (например, по релевантности ?search=) с курсором
+        не поддерживается: вместо тихой замены сортировки ответ 400."""
+        ordering = tuple(queryset.query.order_by) or self.ordering
+        if len(ordering) != 2 or ordering[1].lstrip('-') != 'id':
+            raise ParseError(self.unsupported_ordering_message)
+        self.descending = ordering[0].startswith('-')
+        self.cursor_field = queryset.model._meta.get_field(
+            ordering[0].lstrip('-'))
+        return ordering
+
+    def after(self, value, pk):
+        lookup = 'lt' if self.descending else 'gt'
+        name = self.cursor_field.name
+        return (Q(**{f'{name}__{lookup}': value})
+                | Q(**{name: value, f'pk__{lookup}': pk}))
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response({
+            'count': self.count,
+            'next': self.get_next_link(),
+            'previous': None,
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.next_position))
+
+    def encode_cursor(self, position):
+        value, pk = position
+        return base64.urlsafe_b64encode(f'{value}|{pk}'.encode()).decode()
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            value, pk = base64.urlsafe_b64decode(
+                cursor.encode()).decode().split('|')
+            value = self.cursor_field.to_python(value)
+            pk = int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError,
+                ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if value is None:
+            raise NotFound(self.invalid_cursor_message)
+        return value, pk
+
+    def get_count(self, queryset, request):
+        mode = request.query_params.get(self.count_query_param)
+        if mode == 'exact':
+            return queryset.count()
+        if mode == 'approximate':
+            return estimate_count(queryset)
+        return None
+
+
+def estimate_count(queryset):
+    """Оценка количества строк из плана запроса PostgreSQL;
+    на остальных СУБД считается точное количество."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class FeedPagination(RecipePagination):
+    """Keyset-пагинация ленты подписок (?cursor=&limit=): страница
+    читается диапазоном по индексу ленты пользователя, без OFFSET
+    и без подсчёта общего количества."""
+
+    def paginate_feed(self, queryset, request):
+        self.cursor_mode = True
+        self.request = request
+        self.count = None
+        self.descending = True
+        self.cursor_field = queryset.model._meta.get_field('pub_date')
+        page_size = self.get_page_size(request)
+        entries = read_feed(
+            request.user, page_size + 1, self.decode_cursor(request))
+        self.next_position = None
+        if len(entries) > page_size:
+            entries = entries[:page_size]
+            pub_date, pk = entries[-1]
+            self.next_position = (
+                self.cursor_field.value_to_string(Recipe(pub_date=pub_date)),
+                pk)
+        recipes = queryset.in_bulk([pk for _, pk in entries])
+        return [recipes[pk] for _, pk in entries if pk in recipes]
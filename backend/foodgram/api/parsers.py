@@ -0,0 +1,25 @@
+import json
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import DataAndFiles, MultiPartParser
+
+
+class MultiPartJSONParser(MultiPartParser):
+    """multipart/form-data, где файлы передаются как есть (без base64),
+    а вложенные структуры из атрибута представления
+    multipart_json_fields — строками JSON."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        result = super().parse(stream, media_type, parser_context)
+        view = (parser_context or {}).get('view')
+        json_fields = getattr(view, 'multipart_json_fields', ())
+        data = {}
+        for key, values in result.data.lists():
+            if key in json_fields and len(values) == 1:
+                try:
+                    data[key] = json.loads(values[0])
+                except ValueError as error:
+                    raise ParseError(f'{key}: JSON parse error - {error}')
+            else:
+                data[key] = values if len(values) > 1 else values[0]
+        return DataAndFiles(data, dict(result.files.items()))
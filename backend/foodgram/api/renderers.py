@@ -0,0 +1,149 @@
+import csv
+import json
+import logging
+import os
+from abc import ABCMeta, abstractmethod
+from functools import lru_cache
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework import renderers
+
+CHUNK_SIZE = 64 * 1024
+SHOPPING_LIST_TITLE = 'СПИСОК ИНГРЕДИЕНТОВ'
+
+logger = logging.getLogger(__name__)
+
+
+class ShoppingListRenderer(renderers.BaseRenderer, metaclass=ABCMeta):
+    """Базовый рендерер списка покупок.
+    Файл формируется генератором stream() по мере чтения
+    агрегированных ингредиентов, render() нужен только
+    для ответов с ошибками."""
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            data = data.get('detail', data)
+        return str(data).encode('utf-8')
+
+    @abstractmethod
+    def stream(self, ingredients):
+        """Итератор частей файла со списком ингредиентов."""
+
+
+class TextShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, ingredients):
+        yield f'{SHOPPING_LIST_TITLE}\n'
+        yield '\n'
+        for count, ingredient in enumerate(ingredients, start=1):
+            yield (f'{count}. {ingredient["name"]} '
+                   f'({ingredient["measurement_unit"]}) '
+                   f'- {ingredient["total_amount"]}\n')
+
+
+class Echo:
+    """Псевдо-буфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'measurement_unit', 'amount'))
+        for ingredient in ingredients:
+            yield writer.writerow((ingredient['name'],
+                                   ingredient['measurement_unit'],
+                                   ingredient['total_amount']))
+
+
+class JSONShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Ошибки отдаются тоже в JSON, а не текстом
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+    def stream(self, ingredients):
+        yield '['
+        for count, ingredient in enumerate(ingredients):
+            yield (',' if count else '') + json.dumps({
+                'name': ingredient['name'],
+                'measurement_unit': ingredient['measurement_unit'],
+                'amount': ingredient['total_amount'],
+            }, ensure_ascii=False)
+        yield ']'
+
+
+@lru_cache(maxsize=None)
+def get_pdf_font():
+    """Регистрирует шрифт с кириллицей. Встроенные шрифты PDF
+    кириллицу не отображают, поэтому без него список не формируется."""
+    path = settings.SHOPPING_LIST_PDF_FONT
+    if not os.path.exists(path):
+        logger.error('Shopping list PDF font not found: %s', path)
+        raise ImproperlyConfigured(
+            f'Шрифт для PDF не найден: {path} (SHOPPING_LIST_PDF_FONT)')
+    pdfmetrics.registerFont(TTFont('ShoppingListFont', path))
+    return 'ShoppingListFont'
+
+
+class PDFShoppingListRenderer(ShoppingListRenderer):
+    """PDF собирается постранично во временный файл,
+    который держится в памяти только до CHUNK_SIZE,
+    и отдаётся клиенту частями."""
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    font_size = 12
+    line_height = 18
+    margin = 50
+
+    def stream(self, ingredients):
+        # Шрифт проверяется до начала ответа, а не посреди загрузки
+        return self.generate(get_pdf_font(), ingredients)
+
+    def generate(self, font, ingredients):
+        with SpooledTemporaryFile(max_size=CHUNK_SIZE) as file:
+            self.draw(file, font, ingredients)
+            file.seek(0)
+            while True:
+                chunk = file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+    def draw(self, file, font, ingredients):
+        height = A4[1]
+        pdf = canvas.Canvas(file, pagesize=A4)
+        pdf.setTitle(SHOPPING_LIST_TITLE)
+        pdf.setFont(font, self.font_size + 4)
+        pdf.drawString(self.margin, height - self.margin, SHOPPING_LIST_TITLE)
+        pdf.setFont(font, self.font_size)
+        y = height - self.margin - 2 * self.line_height
+        for count, ingredient in enumerate(ingredients, start=1):
+            if y < self.margin:
+                pdf.showPage()
+                pdf.setFont(font, self.font_size)
+                y = height - self.margin
+            pdf.drawString(
+                self.margin, y,
+                f'{count}. {ingredient["name"]} '
+                f'({ingredient["measurement_unit"]}) '
+                f'- {ingredient["total_amount"]}')
+            y -= self.line_height
+        pdf.save()
@@ -1,12 +1,21 @@
 import base64
+import binascii
+from collections import Counter, defaultdict
+from tempfile import SpooledTemporaryFile
 
 import webcolors
 from django.conf import settings
-from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from djoser.serializers import \
     UserCreateSerializer as BaseUserRegistrationSerializer
-from recipes.models import Follow, Ingredient, Recipe, RecipeIngredient, Tag
+from PIL import Image
+from recipes.images import release_image, schedule_image_variants, variant_name
+from recipes.models import (Follow, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCartIngredient, Tag)
+from recipes.signals import recipe_ingredients_changed
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 from user.models import User
@@ -20,7 +29,23 @@ class UserRegistrationSerializer(BaseUserRegistrationSerializer):
 
 
 class UserSerializer(serializers.ModelSerializer):
-    """Основной сериализатор для User"""
+    """Основной сериализатор для User.
+    is_subscribed берётся из аннотации queryset, а если её нет -
+    из множества авторов, на которых подписан текущий пользователь,
+    загруженного один раз на весь запрос."""
+    is_subscribed = serializers.SerializerMethodField()
+
+    def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        user = self.context['request'].user
+        if not user.is_authenticated:
+            return False
+        if 'subscribed_author_ids' not in self.context:
+            self.context['subscribed_author_ids'] = set(
+                user.follower.values_list('author_id', flat=True))
+        return obj.pk in self.context['subscribed_author_ids']
+
     class Meta:
         fields = ('email', 'id', 'username', 'first_name',
                   'last_name', 'is_subscribed')
@@ -40,14 +65,122 @@ class Hex2NameColor(serializers.Field):
 
 
 class Base64ImageField(serializers.ImageField):
-    def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+    """Изображение рецепта: data URI (data:image/png;base64,...)
+    или файл из multipart-запроса.
+
+    Тип и размер данных проверяются до декодирования, base64
+    декодируется частями во временный файл (в памяти до
+    FILE_UPLOAD_MAX_MEMORY_SIZE, дальше на диске), а формат
+    и размеры изображения читаются из заголовка без декодирования
+    пикселей.
+    """
+    # MIME-тип: (формат Pillow, расширение файла)
+    FORMATS = {
+        'image/jpeg': ('JPEG', 'jpg'),
+        'image/png': ('PNG', 'png'),
+        'image/webp': ('WEBP', 'webp'),
+        'image/gif': ('GIF', 'gif'),
+    }
+    CHUNK_SIZE = 64 * 1024
+    HEADER_MAX_LENGTH = 64
+    default_error_messages = {
+        'format': 'Допустимые форматы изображения: JPEG, PNG, WebP, GIF.',
+        'base64': 'Изображение передано в некорректном base64.',
+        'too_large': 'Размер изображения не должен превышать {max_size} Мб.',
+        'too_many_pixels': 'Слишком большое разрешение изображения.',
+    }
 
-        return super().to_internal_value(data)
+    def to_internal_value(self, data):
+        if isinstance(data, str) and data.startswith('data:'):
+            data = self.decode_data_uri(data)
+        elif not isinstance(data, UploadedFile):
+            self.fail('invalid')
+        elif data.size > settings.RECIPE_IMAGE_MAX_SIZE:
+            self.fail_too_large()
+        return self.check_image(data)
+
+    def fail_too_large(self):
+        self.fail('too_large',
+                  max_size=settings.RECIPE_IMAGE_MAX_SIZE // 1024 // 1024)
+
+    def decode_data_uri(self, data):
+        header_end = data.find(',', 0, self.HEADER_MAX_LENGTH)
+        if header_end < 0:
+            self.fail('invalid_image')
+        content_type, _, encoding = data[len('data:'):header_end].partition(
+            ';')
+        if encoding != 'base64':
+            self.fail('base64')
+        if content_type not in self.FORMATS:
+            self.fail('format')
+        if (len(data) - header_end - 1) // 4 * 3 > (
+                settings.RECIPE_IMAGE_MAX_SIZE):
+            self.fail_too_large()
+        file = SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        try:
+            for start in range(header_end + 1, len(data), self.CHUNK_SIZE):
+                file.write(base64.b64decode(
+                    data[start:start + self.CHUNK_SIZE], validate=True))
+        except binascii.Error:
+            file.close()
+            self.fail('base64')
+        return UploadedFile(
+            file, content_type=content_type, size=file.tell())
+
+    def check_image(self, file):
+        file.seek(0)
+        try:
+            image = Image.open(file)
+        except (OSError, Image.DecompressionBombError):
+            file.close()
+            self.fail('invalid_image')
+        formats = {name: ext for name, ext in self.FORMATS.values()}
+        if image.format not in formats:
+            self.fail('format')
+        # Расширение — только по формату, а не по имени от клиента
+        file.name = 'temp.' + formats[image.format]
+        width, height = image.size
+        if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+            self.fail('too_many_pixels')
+        file.seek(0)
+        return file
+
+
+class RecipeImageField(serializers.Field):
+    """URL уменьшенного WebP-варианта изображения рецепта,
+    а пока варианты не готовы — URL оригинала."""
+
+    def __init__(self, variant, **kwargs):
+        self.variant = variant
+        kwargs.update(source='*', read_only=True)
+        super().__init__(**kwargs)
+
+    def get_url(self, recipe, variant):
+        url = (default_storage.url(variant_name(recipe.image.name, variant))
+               if recipe.has_image_variants else recipe.image.url)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def to_representation(self, recipe):
+        if not recipe.image:
+            return None
+        return self.get_url(recipe, self.variant)
+
+
+class RecipeImageSrcsetField(RecipeImageField):
+    """Значение srcset из всех уменьшенных вариантов изображения."""
+
+    def __init__(self, **kwargs):
+        super().__init__(variant=None, **kwargs)
+
+    def to_representation(self, recipe):
+        if not recipe.image or not recipe.has_image_variants:
+            return None
+        return ', '.join(
+            f'{self.get_url(recipe, variant)} {width}w'
+            for variant, width in settings.RECIPE_IMAGE_VARIANTS.items()
+        )
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -59,13 +192,25 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 
 class TagSerializer(serializers.ModelSerializer):
-    """Сериализатор для тэгов"""
+    """Сериализатор для тэгов.
+    Если в контексте есть словарь tag_representations, представление
+    каждого тэга строится один раз на запрос и используется во всех
+    рецептах страницы."""
     color = Hex2NameColor()
 
     class Meta:
         model = Tag
         fields = ('id', 'name', 'color', 'slug')
 
+    def to_representation(self, instance):
+        representations = self.context.get('tag_representations')
+        if representations is None:
+            return super().to_representation(instance)
+        if instance.pk not in representations:
+            representations[instance.pk] = super().to_representation(
+                instance)
+        return representations[instance.pk]
+
 
 class ListAddIngredientSerializer(serializers.ModelSerializer):
     """Вложенный сериализатор для поля рецепта
@@ -86,7 +231,8 @@ class ListRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для get-действий retrieve и list:
     получение списка и экземпляра объекта Recipe"""
     tags = TagSerializer(many=True)
-    image = Base64ImageField(required=False, allow_null=True)
+    image = RecipeImageField('medium')
+    image_srcset = RecipeImageSrcsetField()
     ingredients = ListAddIngredientSerializer(
         many=True, source='recipe_ingredients')
     author = UserSerializer()
@@ -96,26 +242,24 @@ class ListRecipeSerializer(serializers.ModelSerializer):
         max_value=settings.QUANTITY_MAX, min_value=settings.QUANTITY_MIN)
 
     def get_is_favorited(self, obj):
-        recipe = get_object_or_404(Recipe, name=obj.name)
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context['request'].user
-        if user.is_authenticated:
-            if user.favorites.filter(recipe=recipe).exists():
-                return True
-        return False
+        return (user.is_authenticated
+                and user.favorites.filter(recipe=obj).exists())
 
     def get_is_in_shopping_cart(self, obj):
-        recipe = get_object_or_404(Recipe, name=obj.name)
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context['request'].user
-        if user.is_authenticated:
-            if user.shopping_cart.filter(recipe=recipe).exists():
-                return True
-        return False
+        return (user.is_authenticated
+                and user.shopping_cart.filter(recipe=obj).exists())
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart',
-                  'name', 'image', 'text', 'cooking_time')
+                  'name', 'image', 'image_srcset', 'text', 'cooking_time')
         read_only_fields = ('author',)
         validators = [
             UniqueTogetherValidator(
@@ -125,11 +269,19 @@ class ListRecipeSerializer(serializers.ModelSerializer):
         ]
 
 
+class CookableRecipeSerializer(ListRecipeSerializer):
+    """Рецепт из поиска по имеющимся ингредиентам с долей
+    ингредиентов рецепта, которые есть у пользователя."""
+    coverage = serializers.FloatField(read_only=True)
+
+    class Meta(ListRecipeSerializer.Meta):
+        fields = ListRecipeSerializer.Meta.fields + ('coverage',)
+
+
 class AddIngredientSerializer(serializers.ModelSerializer):
     """Укороченный вложенный сериализатор
     для создания/изменения рецепта"""
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(), source='ingredient')
+    id = serializers.IntegerField(source='ingredient')
     amount = serializers.IntegerField(
         max_value=settings.QUANTITY_MAX, min_value=settings.QUANTITY_MIN)
 
@@ -166,75 +318,146 @@ class RecipeSerializer(serializers.ModelSerializer):
             data.append(RI)
         RecipeIngredient.objects.bulk_create(data)
         recipe.tags.set(tags)
+        Recipe.objects.filter(pk=recipe.pk).update_search_vectors()
+        recipe_ingredients_changed.send(sender=Recipe, recipe_ids=[recipe.pk])
+        schedule_image_variants(recipe)
         return recipe
 
     def update(self, instance, validated_data):
-        instance.name = validated_data.get('name', instance.name)
-        instance.text = validated_data.get('text', instance.text)
-        instance.cooking_time = validated_data.get(
-            'cooking_time', instance.cooking_time)
-        instance.image = validated_data.get('image', instance.image)
-
-        if 'ingredients' not in validated_data and (
-            'tags' not in validated_data
-        ):
-            instance.save()
-            return instance
-        if 'tags' in validated_data:
-            instance.tags.clear()
-            tags_data = self.initial_data.get('tags')
-            instance.tags.set(tags_data)
-            instance.save()
-        if 'ingredients' in validated_data:
-            instance.ingredients.clear()
-            ingredients_data = self.validated_data.get('ingredients')
-            recipe_ingredient_data = ingredients_data.get('recipe_ingredients')
-            data = []
-            for recipe_ingredient in recipe_ingredient_data:
-                RI = RecipeIngredient(
-                    ingredient=recipe_ingredient.get('ingredient'),
-                    amount=recipe_ingredient.get('amount'), recipe=instance)
-                data.append(RI)
-            RecipeIngredient.objects.bulk_create(data)
+        old_image = instance.image.name
+        image_changed = 'image' in validated_data
+        with transaction.atomic():
+            instance.name = validated_data.get('name', instance.name)
+            instance.text = validated_data.get('text', instance.text)
+            instance.cooking_time = validated_data.get(
+                'cooking_time', instance.cooking_time)
+            if image_changed:
+                instance.image = validated_data['image']
+                instance.has_image_variants = False
+            if 'tags' in validated_data:
+                self.update_tags(instance, validated_data['tags'])
+            if 'ingredients' in validated_data:
+                self.update_ingredients(
+                    instance,
+                    validated_data['ingredients']['recipe_ingredients'])
+                recipe_ingredients_changed.send(
+                    sender=Recipe, recipe_ids=[instance.pk])
             instance.save()
+            Recipe.objects.filter(pk=instance.pk).update_search_vectors()
+        if image_changed:
+            self.replace_image(instance, old_image)
         return instance
 
+    def update_tags(self, instance, tags):
+        """Удаляет убранные тэги и добавляет новые, не трогая остальные."""
+        current = {tag.pk for tag in instance.tags.all()}
+        new = {tag.pk for tag in tags}
+        if current - new:
+            instance.tags.remove(*(current - new))
+        if new - current:
+            instance.tags.add(*(new - current))
+
+    def update_ingredients(self, instance, ingredients):
+        """Сравнивает новый состав рецепта с текущим: добавляет новые
+        ингредиенты, меняет количество у изменённых и удаляет убранные.
+        Итоги списков покупок корректируются только на разницу."""
+        amounts = {item['ingredient'].pk: item['amount']
+                   for item in ingredients}
+        rows = {}
+        old_amounts = defaultdict(int)
+        to_delete = []
+        for row in instance.recipe_ingredients.all():
+            old_amounts[row.ingredient_id] += row.amount
+            if row.ingredient_id in rows or row.ingredient_id not in amounts:
+                to_delete.append(row.pk)
+            else:
+                rows[row.ingredient_id] = row
+        to_update = []
+        for ingredient_id, row in rows.items():
+            if row.amount != amounts[ingredient_id]:
+                row.amount = amounts[ingredient_id]
+                to_update.append(row)
+        to_create = [
+            RecipeIngredient(
+                recipe=instance, ingredient_id=ingredient_id, amount=amount)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in rows
+        ]
+        if to_delete:
+            RecipeIngredient.objects.filter(pk__in=to_delete).delete()
+        if to_update:
+            RecipeIngredient.objects.bulk_update(to_update, ['amount'])
+        if to_create:
+            RecipeIngredient.objects.bulk_create(to_create)
+        ShoppingCartIngredient.objects.apply_amounts(instance.pk, {
+            ingredient_id:
+                amounts.get(ingredient_id, 0) - old_amounts[ingredient_id]
+            for ingredient_id in amounts.keys() | old_amounts.keys()
+        })
+
+    def replace_image(self, instance, old_image):
+        if instance.image.name != old_image:
+            release_image(old_image)
+        schedule_image_variants(instance)
+
+    def validate_ingredients(self, value):
+        """Проверяет существование всех ингредиентов одним запросом
+        и отклоняет повторы: иначе создание сохранило бы их отдельными
+        строками, а сумма количеств могла бы превысить QUANTITY_MAX."""
+        ids = [item['ingredient'] for item in value]
+        repeated = sorted(
+            pk for pk, count in Counter(ids).items() if count > 1)
+        if repeated:
+            raise serializers.ValidationError(
+                f'Ингредиенты с id {repeated} указаны несколько раз.')
+        found = Ingredient.objects.in_bulk(set(ids))
+        missing = [item['ingredient'] for item in value
+                   if item['ingredient'] not in found]
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиентов с id {missing} не существует.')
+        for item in value:
+            item['ingredient'] = found[item['ingredient']]
+        return value
+
     def to_representation(self, data):
+        recipe = Recipe.objects.with_related().with_user_flags(
+            self.context['request'].user).get(pk=data.pk)
         return ListRecipeSerializer(
-            context=self.context).to_representation(data)
+            context=self.context).to_representation(recipe)
 
 
 class ShortListRecipeSerializer(serializers.ModelSerializer):
     """Вложенный сериализатор для укороченного обзора рецепта"""
+    image = RecipeImageField('thumbnail')
+    image_srcset = RecipeImageSrcsetField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_srcset', 'cooking_time')
 
 
-class SubscriptionsSerializer(serializers.ModelSerializer):
-    """Страница подписок"""
-    # recipes = ShortListRecipeSerializer(many=True, read_only=True)
-    recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для массового добавления и удаления."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_RECIPES_MAX
+    )
 
-    def get_recipes_count(self, obj):
-        author = get_object_or_404(User, username=obj.username)
-        return author.recipes.count()
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
 
-    def get_recipes(self, obj):
-        recipes_limit = (
-            self.context.get('request').query_params.get('recipes_limit')
-        )
-        if recipes_limit:
-            queryset = obj.recipes.all()[:int(recipes_limit)]
-        else:
-            queryset = obj.recipes.all()
-        return ShortListRecipeSerializer(queryset, many=True).data
 
-    class Meta:
+class SubscriptionsSerializer(UserSerializer):
+    """Страница подписок. Ожидает авторов с аннотацией recipes_count
+    и рецептами, уже ограниченными параметром recipes_limit."""
+    recipes = ShortListRecipeSerializer(many=True, read_only=True)
+    recipes_count = serializers.IntegerField(read_only=True)
+
+    class Meta(UserSerializer.Meta):
         fields = ('id', 'email', 'username', 'first_name',
                   'last_name', 'is_subscribed', 'recipes', 'recipes_count')
-        model = User
 
 
 class FollowSerializer(serializers.ModelSerializer):
@@ -244,21 +467,16 @@ class FollowSerializer(serializers.ModelSerializer):
     username = serializers.ReadOnlyField(source='author.username')
     first_name = serializers.ReadOnlyField(source='author.first_name')
     last_name = serializers.ReadOnlyField(source='author.last_name')
-    is_subscribed = serializers.ReadOnlyField(source='author.is_subscribed')
+    is_subscribed = serializers.SerializerMethodField()
     recipes = ShortListRecipeSerializer(
         source='author.recipes', many=True, read_only=True)
     recipes_count = serializers.SerializerMethodField()
 
-    def get_recipes_count(self, obj):
-        follow = get_object_or_404(Follow, id=obj.id)
-        return follow.author.recipes.count()
+    def get_is_subscribed(self, obj):
+        return obj.user_id == self.context['request'].user.pk
 
-    def create(self, validated_data):
-        author = validated_data.get('author')
-        setattr(author, 'is_subscribed', True)
-        author.save()
-        follow = Follow.objects.create(**validated_data)
-        return follow
+    def get_recipes_count(self, obj):
+        return obj.author.recipes.count()
 
     def validate(self, data):
         user = self.context['request'].user
@@ -0,0 +1,27 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from recipes.models import Ingredient, Recipe, Tag
+from recipes.signals import recipe_ingredients_changed
+
+from .cache import bump_reference_version
+from .cookable import mark_changed
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_reference_data(sender, **kwargs):
+    bump_reference_version(sender)
+
+
+@receiver(recipe_ingredients_changed, sender=Recipe)
+def update_cookable_index(sender, recipe_ids, **kwargs):
+    transaction.on_commit(lambda: mark_changed(recipe_ids))
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_from_cookable_index(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: mark_changed([pk]))
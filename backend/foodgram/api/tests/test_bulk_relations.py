@@ -0,0 +1,73 @@
+import json
+
+from django.test import Client, TestCase
+from recipes.models import Favourite, Recipe, ShoppingCart
+from rest_framework.authtoken.models import Token
+from user.models import User
+
+
+class BulkRelationsTest(TestCase):
+    """Массовое добавление рецептов в избранное и корзину."""
+    FAVORITE_URL = '/api/recipes/favorite/'
+    CART_URL = '/api/recipes/shopping_cart/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@ai.ru')
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@ai.ru')
+        cls.token = Token.objects.create(user=cls.user)
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {i}', text='Описание',
+                cooking_time=10)
+            for i in range(20)
+        ]
+        cls.ids = [recipe.pk for recipe in cls.recipes]
+
+    def setUp(self):
+        self.client = Client(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def send(self, method, url, recipes):
+        response = getattr(self.client, method)(
+            url, json.dumps({'recipes': recipes}),
+            content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return {item['id']: item['status']
+                for item in response.json()['recipes']}
+
+    def test_add_and_remove_many(self):
+        missing = self.ids[-1] + 1
+        Favourite.objects.create(user=self.user, recipe=self.recipes[0])
+        statuses = self.send('post', self.FAVORITE_URL, self.ids + [missing])
+        self.assertEqual(statuses[self.ids[0]], 'already_added')
+        self.assertEqual(statuses[missing], 'not_found')
+        self.assertEqual(
+            [statuses[pk] for pk in self.ids[1:]], ['added'] * 19)
+        self.assertEqual(
+            Favourite.objects.filter(user=self.user).count(), 20)
+        self.recipes[5].refresh_from_db()
+        self.assertEqual(self.recipes[5].favorites_count, 1)
+
+        statuses = self.send('delete', self.FAVORITE_URL, self.ids[:2])
+        self.assertEqual(set(statuses.values()), {'removed'})
+        statuses = self.send('delete', self.FAVORITE_URL, self.ids[:1])
+        self.assertEqual(statuses, {self.ids[0]: 'not_added'})
+
+    def test_meal_plan_is_one_round_trip(self):
+        # Плюс SAVEPOINT и RELEASE транзакции.
+        with self.assertNumQueries(6):
+            statuses = self.send('post', self.CART_URL, self.ids)
+        self.assertEqual(set(statuses.values()), {'added'})
+        self.assertEqual(
+            ShoppingCart.objects.filter(user=self.user).count(), 20)
+
+    def test_validation(self):
+        for body in ({}, {'recipes': []}, {'recipes': ['x']},
+                     {'recipes': list(range(1, 200))}):
+            with self.subTest(body=body):
+                response = self.client.post(
+                    self.CART_URL, json.dumps(body),
+                    content_type='application/json')
+                self.assertEqual(response.status_code, 400)
@@ -0,0 +1,146 @@
+from datetime import timedelta
+from unittest import mock
+
+from api.cookable import CookableIndex, cookable_index, mark_changed
+from django.test import Client, TestCase
+from django.utils import timezone
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            RecipeIngredientChange, Tag)
+from rest_framework.authtoken.models import Token
+from user.models import User
+
+
+class CookableRecipesTest(TestCase):
+    """Поиск рецептов по имеющимся ингредиентам."""
+    URL = '/api/recipes/cookable/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@ai.ru')
+        cls.token = Token.objects.create(user=cls.author)
+        cls.tag = Tag.objects.create(
+            name='Обед', slug='lunch', color='#000000')
+        cls.eggs, cls.milk, cls.flour, cls.salt = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('яйца', 'молоко', 'мука', 'соль')
+        )
+        cls.omelette = cls.create_recipe('Омлет', cls.eggs, cls.milk)
+        cls.pancakes = cls.create_recipe(
+            'Блины', cls.eggs, cls.milk, cls.flour)
+        cls.bread = cls.create_recipe('Хлеб', cls.flour, cls.salt)
+
+    @classmethod
+    def create_recipe(cls, name, *ingredients):
+        recipe = Recipe.objects.create(
+            author=cls.author, name=name, text='Описание', cooking_time=10)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=1)
+            for ingredient in ingredients
+        )
+        return recipe
+
+    def setUp(self):
+        cookable_index.invalidate()
+        self.client = Client(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def search(self, *ingredients):
+        response = Client().get(
+            self.URL, {'ingredients': [item.pk for item in ingredients]})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [(recipe['name'], recipe['coverage'])
+                for recipe in response.json()]
+
+    def test_recipes_are_ranked_by_coverage(self):
+        self.assertEqual(self.search(self.eggs, self.milk), [
+            ('Омлет', 1.0), ('Блины', 2 / 3)])
+        self.assertEqual(self.search(self.flour), [
+            ('Хлеб', 0.5), ('Блины', 1 / 3)])
+
+    def test_index_follows_recipe_changes(self):
+        self.search(self.eggs)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f'/api/recipes/{self.bread.pk}/',
+                {'ingredients': [{'id': self.flour.pk, 'amount': 1}]},
+                content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.omelette.delete()
+        self.assertEqual(self.search(self.flour), [
+            ('Хлеб', 1.0), ('Блины', 1 / 3)])
+        self.assertEqual(self.search(self.eggs), [('Блины', 1 / 3)])
+
+    def test_incremental_refresh_matches_rebuild(self):
+        self.search(self.eggs)
+        with mock.patch('recipes.feed.executor'), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.URL.replace('cookable/', ''), {
+                'name': 'Сырники',
+                'text': 'Описание',
+                'cooking_time': 20,
+                'tags': [self.tag.pk],
+                'ingredients': [{'id': self.eggs.pk, 'amount': 2},
+                                {'id': self.flour.pk, 'amount': 1}],
+            }, content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        refreshed = cookable_index.get_snapshot()
+        self.assertIn(response.json()['id'], refreshed[2])
+        cookable_index.invalidate()
+        self.assertEqual(cookable_index.get_snapshot(), refreshed)
+
+    def test_changes_are_shared_through_database(self):
+        other_process = CookableIndex()
+        self.assertEqual(other_process.search([self.salt.pk], 10),
+                         [(self.bread.pk, 0.5)])
+        RecipeIngredient.objects.create(
+            recipe=self.omelette, ingredient=self.salt, amount=1)
+        mark_changed([self.omelette.pk])
+        self.assertEqual(other_process.search([self.salt.pk], 10), [
+            (self.bread.pk, 0.5), (self.omelette.pk, 1 / 3)])
+
+    def test_refresh_stops_at_uncommitted_change(self):
+        applied = cookable_index.get_snapshot()[0]
+        RecipeIngredient.objects.filter(recipe=self.omelette).delete()
+        RecipeIngredientChange.objects.create(
+            id=applied + 2, recipe_id=self.omelette.pk)
+        snapshot = cookable_index.get_snapshot()
+        self.assertEqual(snapshot[0], applied)
+        self.assertNotIn(self.omelette.pk, snapshot[2])
+
+    def test_refresh_skips_old_gap(self):
+        applied = cookable_index.get_snapshot()[0]
+        RecipeIngredient.objects.filter(recipe=self.omelette).delete()
+        RecipeIngredientChange.objects.create(
+            id=applied + 2, recipe_id=self.omelette.pk)
+        RecipeIngredientChange.objects.filter(id=applied + 2).update(
+            created=timezone.now() - timedelta(minutes=1))
+        snapshot = cookable_index.get_snapshot()
+        self.assertEqual(snapshot[0], applied + 2)
+        self.assertNotIn(self.omelette.pk, snapshot[2])
+        with self.assertNumQueries(1):
+            cookable_index.get_snapshot()
+
+    def test_invalid_ingredients(self):
+        self.assertEqual(Client().get(self.URL).status_code, 400)
+        self.assertEqual(
+            Client().get(self.URL, {'ingredients': 'яйца'}).status_code, 400)
+        self.assertEqual(
+            Client().get(self.URL, {'ingredients': '３'}).status_code, 400)
+
+    def test_invalid_limit(self):
+        for limit in ('0', '-1', '²', '٣', 'ten'):
+            with self.subTest(limit=limit):
+                response = Client().get(self.URL, {
+                    'ingredients': self.eggs.pk, 'limit': limit})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('limit', response.json())
+        response = Client().get(
+            self.URL, {'ingredients': self.eggs.pk, 'limit': 1})
+        self.assertEqual(len(response.json()), 1)
+
+    def test_search_does_not_query_ingredients(self):
+        self.search(self.eggs)
+        # Номер версии журнала, рецепты, их тэги и ингредиенты
+        with self.assertNumQueries(4):
+            self.search(self.eggs, self.milk, self.flour)
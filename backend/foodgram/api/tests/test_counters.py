@@ -0,0 +1,84 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import Client, TestCase, override_settings
+from recipes.counters import FAVORITES, buffer
+from recipes.models import Favourite, Recipe
+from rest_framework.authtoken.models import Token
+from user.models import User
+
+
+class RecipeCountersTest(TestCase):
+    """Счётчики избранного и корзин у рецепта."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@ai.ru')
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@ai.ru')
+        cls.token = Token.objects.create(user=cls.user)
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Рецепт', text='Описание',
+            cooking_time=10)
+
+    def setUp(self):
+        self.client = Client(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def counters(self):
+        self.recipe.refresh_from_db()
+        return self.recipe.favorites_count, self.recipe.in_carts_count
+
+    def test_counters_follow_favorite_and_cart(self):
+        url = f'/api/recipes/{self.recipe.pk}/'
+        self.client.post(url + 'favorite/')
+        self.client.post(url + 'shopping_cart/')
+        self.assertEqual(self.counters(), (1, 1))
+        self.client.post(url + 'favorite/')
+        self.assertEqual(self.counters(), (1, 1))
+        self.client.delete(url + 'favorite/')
+        self.client.delete(url + 'shopping_cart/')
+        self.assertEqual(self.counters(), (0, 0))
+
+    @override_settings(RECIPE_COUNTERS_BUFFERED=True,
+                       RECIPE_COUNTERS_FLUSH_INTERVAL=60)
+    def test_buffered_counters_are_written_on_flush(self):
+        url = f'/api/recipes/{self.recipe.pk}/favorite/'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url)
+        self.assertEqual(self.counters(), (0, 0))
+        buffer.flush()
+        self.assertEqual(self.counters(), (1, 0))
+
+    @override_settings(RECIPE_COUNTERS_BUFFERED=True)
+    def test_buffer_is_filled_after_commit(self):
+        url = f'/api/recipes/{self.recipe.pk}/favorite/'
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(url)
+        self.assertEqual(len(callbacks), 1)
+
+    def test_relation_is_rolled_back_with_counter(self):
+        url = f'/api/recipes/{self.recipe.pk}/shopping_cart/'
+        with mock.patch('api.views.change_counter',
+                        side_effect=DatabaseError), \
+                self.assertRaises(DatabaseError):
+            self.client.post(url)
+        self.assertFalse(self.user.shopping_cart.exists())
+
+    @override_settings(RECIPE_COUNTERS_FLUSH_SIZE=2)
+    def test_buffer_flushes_when_full(self):
+        other = Recipe.objects.create(
+            author=self.author, name='Другой', text='Описание',
+            cooking_time=5)
+        buffer.add(FAVORITES, [self.recipe.pk], 1)
+        self.assertEqual(self.counters(), (0, 0))
+        buffer.add(FAVORITES, [other.pk], 1)
+        self.assertEqual(self.counters(), (1, 0))
+
+    def test_reconcile_fixes_stale_counters(self):
+        Favourite.objects.create(user=self.user, recipe=self.recipe)
+        Recipe.objects.filter(pk=self.recipe.pk).update(in_carts_count=3)
+        call_command('reconcile_recipe_counters', stdout=StringIO())
+        self.assertEqual(self.counters(), (1, 0))
@@ -0,0 +1,117 @@
+from django.test import Client, TestCase, override_settings
+from recipes.feed import fan_out
+from recipes.models import FeedItem, Follow, Recipe
+from rest_framework.authtoken.models import Token
+from user.models import User
+
+
+@override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+class SubscriptionsFeedTest(TestCase):
+    """Лента рецептов авторов из подписок."""
+    URL = '/api/recipes/feed/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader, cls.other_reader, cls.author, cls.popular, cls.stranger = (
+            User.objects.create_user(username=name, email=f'{name}@ai.ru')
+            for name in ('reader', 'other', 'author', 'popular', 'stranger')
+        )
+        cls.token = Token.objects.create(user=cls.reader)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Follow.objects.create(user=cls.reader, author=cls.popular)
+        Follow.objects.create(user=cls.other_reader, author=cls.popular)
+
+    def setUp(self):
+        self.client = Client(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def publish(self, author, count):
+        recipes = []
+        for _ in range(count):
+            recipe = Recipe.objects.create(
+                author=author,
+                name=f'{author.username} {Recipe.objects.count()}',
+                text='Описание', cooking_time=10)
+            fan_out(recipe.pk)
+            recipes.append(recipe)
+        return recipes
+
+    def read_feed(self, limit=3):
+        names = []
+        url = f'{self.URL}?limit={limit}'
+        while url:
+            data = self.client.get(url).json()
+            names += [recipe['name'] for recipe in data['results']]
+            url = data['next']
+        return names
+
+    def test_feed_merges_fanned_out_and_popular_authors(self):
+        recipes = []
+        for author in (self.author, self.popular, self.author,
+                       self.stranger, self.popular):
+            recipes += self.publish(author, 1)
+        self.assertEqual(
+            FeedItem.objects.filter(user=self.reader).count(), 2)
+        self.assertFalse(FeedItem.objects.filter(
+            recipe__author=self.popular).exists())
+        expected = [recipe.name for recipe in reversed(recipes)
+                    if recipe.author != self.stranger]
+        self.assertEqual(self.read_feed(limit=3), expected)
+        self.assertEqual(self.read_feed(limit=1), expected)
+
+    def test_not_yet_fanned_out_recipe_is_visible(self):
+        recipe = Recipe.objects.create(
+            author=self.author, name='Новый', text='Описание',
+            cooking_time=10)
+        self.assertEqual(self.read_feed(), [recipe.name])
+        fan_out(recipe.pk)
+        self.assertEqual(self.read_feed(), [recipe.name])
+
+    def test_follow_and_unfollow_update_timeline(self):
+        self.publish(self.stranger, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(user=self.reader, author=self.stranger)
+        self.assertEqual(
+            FeedItem.objects.filter(
+                user=self.reader, author=self.stranger).count(), 2)
+        self.client.delete(f'/api/users/{self.stranger.pk}/subscribe/')
+        self.assertFalse(FeedItem.objects.filter(
+            user=self.reader, author=self.stranger).exists())
+        self.assertEqual(self.read_feed(), [])
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=10,
+                       FEED_FANOUT_BATCH_SIZE=1)
+    def test_fan_out_in_batches_checks_follows(self):
+        recipe = Recipe.objects.create(
+            author=self.popular, name='Новый', text='Описание',
+            cooking_time=10)
+        Follow.objects.filter(user=self.other_reader).delete()
+        self.assertEqual(fan_out(recipe.pk), 1)
+        self.assertEqual(
+            list(FeedItem.objects.values_list('user', 'recipe')),
+            [(self.reader.pk, recipe.pk)])
+
+    def test_follow_during_fan_out_gets_recipe(self):
+        recipe = Recipe.objects.create(
+            author=self.stranger, name='Новый', text='Описание',
+            cooking_time=10)
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(user=self.reader, author=self.stranger)
+        fan_out(recipe.pk)
+        self.assertTrue(FeedItem.objects.filter(
+            user=self.reader, recipe=recipe).exists())
+
+    def test_backfill_skips_removed_follow(self):
+        self.publish(self.stranger, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(user=self.reader, author=self.stranger)
+            Follow.objects.filter(
+                user=self.reader, author=self.stranger).delete()
+        self.assertFalse(FeedItem.objects.filter(
+            user=self.reader, author=self.stranger).exists())
+
+    def test_query_count_does_not_depend_on_feed_size(self):
+        self.publish(self.author, 10)
+        self.publish(self.popular, 10)
+        with self.assertNumQueries(7):
+            data = self.client.get(self.URL + '?limit=6').json()
+        self.assertEqual(len(data['results']), 6)
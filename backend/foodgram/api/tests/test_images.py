@@ -0,0 +1,271 @@
+import base64
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from PIL import Image
+from recipes.images import process_recipe_image, run_in_worker, variant_name
+from recipes.models import Ingredient, Recipe, Tag
+from recipes.storage import image_storage
+from rest_framework.authtoken.models import Token
+from user.models import User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_image(size=(1200, 600), format='PNG'):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'orange').save(buffer, format)
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeImageVariantsTest(TestCase):
+    """Уменьшенные WebP-варианты изображений рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@ai.ru')
+        cls.token = Token.objects.create(user=cls.author)
+        cls.tag = Tag.objects.create(name='Тэг', slug='tag', color='#000000')
+        cls.ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def test_variants_are_built_and_served(self):
+        recipe = Recipe(author=self.author, name='Рецепт', text='Описание',
+                        cooking_time=10)
+        recipe.image.save('photo.png', ContentFile(make_image()))
+        data = self.client.get(f'/api/recipes/{recipe.pk}/').json()
+        self.assertTrue(data['image'].endswith('.png'))
+        self.assertIsNone(data['image_srcset'])
+
+        self.assertTrue(process_recipe_image(recipe.pk))
+        with default_storage.open(
+                variant_name(recipe.image.name, 'thumbnail')) as file:
+            thumbnail = Image.open(file)
+            self.assertEqual(thumbnail.format, 'WEBP')
+            self.assertEqual(thumbnail.size, (320, 160))
+        data = self.client.get(f'/api/recipes/{recipe.pk}/').json()
+        self.assertTrue(data['image'].endswith('_medium.webp'))
+        self.assertIn('_thumbnail.webp 320w', data['image_srcset'])
+        self.assertIn('_medium.webp 800w', data['image_srcset'])
+
+    def test_variant_names_keep_extension(self):
+        self.assertNotEqual(
+            variant_name('recipes/images/temp.jpg', 'medium'),
+            variant_name('recipes/images/temp.png', 'medium'))
+        self.assertEqual(
+            variant_name('recipes/images/temp.jpg', 'medium'),
+            'recipes/images/variants/temp_jpg_medium.webp')
+
+    def test_processing_is_scheduled_after_create(self):
+        image = base64.b64encode(make_image()).decode()
+        with mock.patch('recipes.images.executor') as executor, \
+                mock.patch('recipes.feed.executor'):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    '/api/recipes/',
+                    {
+                        'name': 'Рецепт', 'text': 'Описание',
+                        'cooking_time': 10, 'tags': [self.tag.pk],
+                        'ingredients': [
+                            {'id': self.ingredient.pk, 'amount': 1}],
+                        'image': 'data:image/png;base64,' + image,
+                    },
+                    content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        recipe = Recipe.objects.get()
+        self.assertFalse(recipe.has_image_variants)
+        executor.submit.assert_called_once_with(run_in_worker, recipe.pk)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeImageUploadTest(TestCase):
+    """Загрузка изображения рецепта в base64 и multipart."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@ai.ru')
+        cls.token = Token.objects.create(user=cls.author)
+        cls.tag = Tag.objects.create(name='Тэг', slug='tag', color='#000000')
+        cls.ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def post(self, image):
+        return self.client.post(
+            '/api/recipes/',
+            {
+                'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 10,
+                'tags': [self.tag.pk],
+                'ingredients': [{'id': self.ingredient.pk, 'amount': 1}],
+                'image': image,
+            },
+            content_type='application/json')
+
+    def data_uri(self, content, content_type='image/png'):
+        return (f'data:{content_type};base64,'
+                + base64.b64encode(content).decode())
+
+    def test_base64_upload(self):
+        response = self.post(self.data_uri(make_image(format='JPEG'),
+                                           'image/jpeg'))
+        self.assertEqual(response.status_code, 201, response.content)
+        recipe = Recipe.objects.get()
+        self.assertTrue(recipe.image.name.endswith('.jpg'))
+        with recipe.image.open() as file:
+            self.assertEqual(Image.open(file).size, (1200, 600))
+
+    def test_invalid_uploads(self):
+        invalid = {
+            'mime': self.data_uri(make_image(), 'image/svg+xml'),
+            'not base64': 'data:image/png,' + 'A' * 8,
+            'broken base64': 'data:image/png;base64,AAA$AAAA',
+            'not an image': self.data_uri(b'not an image'),
+            'url': 'http://example.com/image.png',
+        }
+        for case, image in invalid.items():
+            with self.subTest(case=case):
+                response = self.post(image)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('image', response.json())
+        self.assertFalse(Recipe.objects.exists())
+
+    @override_settings(RECIPE_IMAGE_MAX_SIZE=1000)
+    def test_size_is_checked_before_decoding(self):
+        with mock.patch('api.serializers.base64.b64decode') as b64decode:
+            response = self.post(self.data_uri(make_image()))
+        self.assertEqual(response.status_code, 400)
+        b64decode.assert_not_called()
+
+    @override_settings(RECIPE_IMAGE_MAX_PIXELS=1000)
+    def test_resolution_limit(self):
+        response = self.post(self.data_uri(make_image()))
+        self.assertEqual(response.status_code, 400)
+
+    def test_multipart_upload(self):
+        image = SimpleUploadedFile(
+            'photo.png', make_image(), content_type='image/png')
+        response = self.client.post('/api/recipes/', {
+            'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 10,
+            'tags': json.dumps([self.tag.pk]),
+            'ingredients': json.dumps(
+                [{'id': self.ingredient.pk, 'amount': 1}]),
+            'image': image,
+        })
+        self.assertEqual(response.status_code, 201, response.content)
+        recipe = Recipe.objects.get()
+        self.assertTrue(recipe.image.name.endswith('.png'))
+        self.assertEqual(recipe.ingredients.get(), self.ingredient)
+
+    def test_multipart_name_is_ignored(self):
+        image = SimpleUploadedFile(
+            'x.html', make_image(), content_type='text/html')
+        response = self.client.post('/api/recipes/', {
+            'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 10,
+            'tags': json.dumps([self.tag.pk]),
+            'ingredients': json.dumps(
+                [{'id': self.ingredient.pk, 'amount': 1}]),
+            'image': image,
+        })
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertTrue(Recipe.objects.get().image.name.endswith('.png'))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ContentAddressedImagesTest(TestCase):
+    """Хранение изображений по хешу содержимого."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@ai.ru')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def create_recipe(self, name, content):
+        recipe = Recipe(author=self.author, name=name, text='Описание',
+                        cooking_time=10)
+        recipe.image.save('temp.png', ContentFile(content))
+        return recipe
+
+    def test_same_image_is_stored_once(self):
+        content = make_image()
+        first = self.create_recipe('Первый', content)
+        second = self.create_recipe('Второй', content)
+        digest = hashlib.sha256(content).hexdigest()
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(
+            first.image.name, f'recipes/images/{digest[:2]}/{digest}.png')
+
+    @override_settings(RECIPE_IMAGE_MIN_AGE=0)
+    def test_released_image_is_deleted_when_unreferenced(self):
+        shared = make_image((100, 100))
+        first = self.create_recipe('Первый', shared)
+        second = self.create_recipe('Второй', shared)
+        name = first.image.name
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(image_storage.exists(name))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(image_storage.exists(name))
+
+    def test_extension_comes_from_image_format(self):
+        name = image_storage.save(
+            'recipes/images/x.html', ContentFile(make_image(format='GIF')))
+        self.assertTrue(name.endswith('.gif'))
+        with self.assertRaises(SuspiciousFileOperation):
+            image_storage.save('recipes/images/x.html',
+                               ContentFile(b'<script></script>'))
+
+    def test_reused_image_is_not_released(self):
+        recipe = self.create_recipe('Первый', make_image((40, 40)))
+        name = recipe.image.name
+        path = image_storage.path(name)
+        os.utime(path, (0, 0))
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.delete()
+            # Тот же файл сохраняется для рецепта, ещё не записанного в базу
+            image_storage.save('recipes/images/temp.png',
+                               ContentFile(make_image((40, 40))))
+        self.assertTrue(image_storage.exists(name))
+        self.assertGreater(os.path.getmtime(path), 0)
+
+    def test_garbage_collection(self):
+        kept = self.create_recipe('Рецепт', make_image((50, 50)))
+        orphan = image_storage.save(
+            'recipes/images/temp.png', ContentFile(make_image((60, 60))))
+        call_command('collect_image_garbage', min_age=0, stdout=StringIO())
+        self.assertTrue(image_storage.exists(kept.image.name))
+        self.assertFalse(image_storage.exists(orphan))
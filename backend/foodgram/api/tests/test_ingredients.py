@@ -0,0 +1,70 @@
+from io import StringIO
+
+from api.autocomplete import ingredient_index
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from recipes.models import Ingredient
+
+
+class IngredientSearchTest(TestCase):
+    URL = '/api/ingredients/'
+
+    @classmethod
+    def setUpTestData(cls):
+        for name in ('морская соль', 'соль', 'соль крупная', 'сахар'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+
+    def setUp(self):
+        self.client = Client()
+        ingredient_index.invalidate()
+
+    def search(self, query):
+        response = self.client.get(self.URL + query)
+        self.assertEqual(response.status_code, 200)
+        return [ingredient['name'] for ingredient in response.json()]
+
+    def test_prefix_matches_go_before_substring_matches(self):
+        expected = ['соль', 'соль крупная', 'морская соль']
+        with self.assertNumQueries(1):
+            self.assertEqual(self.search('?name=Соль'), expected)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.search('?name=Соль'), expected)
+        self.assertEqual(self.search('?name=соль&limit=2'), expected[:2])
+
+    def test_index_is_invalidated_on_ingredient_changes(self):
+        self.assertEqual(self.search('?name=сол'),
+                         ['соль', 'соль крупная', 'морская соль'])
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='солод', measurement_unit='г')
+            Ingredient.objects.filter(name='морская соль').get().delete()
+        self.assertEqual(self.search('?name=сол'),
+                         ['солод', 'соль', 'соль крупная'])
+
+    @override_settings(INGREDIENT_INDEX_ENABLED=False)
+    def test_database_fallback_ranks_and_limits(self):
+        self.assertEqual(self.search('?name=sol'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(
+                name='sea salt sol', measurement_unit='г')
+            Ingredient.objects.create(name='sol', measurement_unit='г')
+        self.assertEqual(self.search('?name=SOL'), ['sol', 'sea salt sol'])
+        self.assertEqual(self.search('?name=sol&limit=1'), ['sol'])
+
+    def test_invalid_limit(self):
+        for limit in ('0', '²', '٣', '３'):
+            with self.subTest(limit=limit):
+                response = self.client.get(
+                    self.URL, {'name': 'соль', 'limit': limit})
+                self.assertEqual(response.status_code, 400)
+
+
+class LoadIngredientsCommandTest(TestCase):
+    def test_loader_is_incremental(self):
+        Ingredient.objects.create(
+            name='абрикосовое варенье', measurement_unit='г')
+        call_command('load_csv_data', stdout=StringIO())
+        loaded = Ingredient.objects.count()
+        self.assertGreater(loaded, 2000)
+        call_command('load_csv_data', 'data/ingredients.json',
+                     batch_size=100, stdout=StringIO())
+        self.assertEqual(Ingredient.objects.count(), loaded)
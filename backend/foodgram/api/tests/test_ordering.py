@@ -0,0 +1,71 @@
+from datetime import timedelta
+
+from django.test import Client, TestCase
+from django.utils import timezone
+from recipes.models import Favourite, Recipe, ShoppingCart
+from user.models import User
+
+
+class RecipeOrderingTest(TestCase):
+    URL = '/api/recipes/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@ai.ru')
+        cls.readers = [
+            User.objects.create_user(
+                username=f'reader{i}', email=f'reader{i}@ai.ru')
+            for i in range(3)
+        ]
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {i}', text='Описание',
+                cooking_time=30 - i, favorites_count=i % 3)
+            for i in range(8)
+        ]
+
+    def setUp(self):
+        self.client = Client()
+
+    def names(self, query):
+        return [recipe['name'] for recipe in self.client.get(
+            self.URL + query).json()['results']]
+
+    def test_popular_and_cooking_time(self):
+        self.assertEqual(self.names('?ordering=popular&limit=3'),
+                         ['Рецепт 5', 'Рецепт 2', 'Рецепт 7'])
+        self.assertEqual(self.names('?ordering=cooking_time&limit=2'),
+                         ['Рецепт 7', 'Рецепт 6'])
+
+    def test_unknown_ordering(self):
+        response = self.client.get(self.URL + '?ordering=name')
+        self.assertEqual(response.status_code, 400)
+
+    def test_cursor_follows_ordering(self):
+        data = self.client.get(
+            self.URL + '?ordering=popular&cursor=&limit=3').json()
+        names = [recipe['name'] for recipe in data['results']]
+        while data['next']:
+            data = self.client.get(data['next']).json()
+            names += [recipe['name'] for recipe in data['results']]
+        expected = sorted(
+            self.recipes, key=lambda r: (-r.favorites_count, -r.pk))
+        self.assertEqual(names, [recipe.name for recipe in expected])
+
+    def test_trending_decays_with_time(self):
+        now = timezone.now()
+        old, fresh, quiet = self.recipes[:3]
+        for reader in self.readers:
+            Favourite.objects.create(user=reader, recipe=old)
+        Favourite.objects.filter(recipe=old).update(
+            pub_date=now - timedelta(days=10))
+        Favourite.objects.create(user=self.readers[0], recipe=fresh)
+        ShoppingCart.objects.create(user=self.readers[0], recipe=fresh)
+        Recipe.objects.filter(pk=quiet.pk).update(trending_score=5)
+        Recipe.objects.all().recompute_trending(now=now)
+        self.assertEqual(
+            self.names('?ordering=trending&limit=3'),
+            [fresh.name, old.name, self.recipes[-1].name])
+        quiet.refresh_from_db()
+        self.assertEqual(quiet.trending_score, 0)
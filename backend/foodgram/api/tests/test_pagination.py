@@ -0,0 +1,85 @@
+from unittest import mock
+
+from api.pagination import LimitPageNumberPagination
+from django.test import Client, TestCase
+from recipes.models import Recipe
+from user.models import User
+
+
+class RecipeCursorPaginationTest(TestCase):
+    URL = '/api/recipes/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@ai.ru')
+        for i in range(8):
+            cls.create_recipe(i)
+
+    @classmethod
+    def create_recipe(cls, number):
+        return Recipe.objects.create(
+            author=cls.author, name=f'Рецепт {number}',
+            text='Описание', cooking_time=10)
+
+    def setUp(self):
+        self.client = Client()
+
+    def test_page_number_mode_is_default(self):
+        data = self.client.get(self.URL + '?page=2').json()
+        self.assertEqual(data['count'], 8)
+        self.assertEqual(len(data['results']), 2)
+
+    def test_cursor_pages_are_stable_under_inserts(self):
+        with self.assertNumQueries(3):
+            first = self.client.get(self.URL + '?cursor=').json()
+        self.assertIsNone(first['count'])
+        self.create_recipe('новый')
+        second = self.client.get(first['next']).json()
+        self.assertIsNone(second['next'])
+        names = [recipe['name']
+                 for recipe in first['results'] + second['results']]
+        self.assertEqual(
+            names, [f'Рецепт {i}' for i in reversed(range(8))])
+
+    def test_cursor_count(self):
+        data = self.client.get(self.URL + '?cursor=&count=exact').json()
+        self.assertEqual(data['count'], 8)
+        data = self.client.get(
+            self.URL + '?cursor=&count=approximate').json()
+        self.assertEqual(data['count'], 8)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.URL + '?cursor=broken')
+        self.assertEqual(response.status_code, 404)
+
+
+class LimitPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@ai.ru')
+        for i in range(10):
+            User.objects.create_user(
+                username=f'user_{i}', email=f'user_{i}@ai.ru')
+            Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {i}',
+                text='Описание', cooking_time=10)
+
+    def setUp(self):
+        self.client = Client()
+
+    def test_limit_does_not_change_query_count(self):
+        for url in ('/api/recipes/', '/api/users/'):
+            for limit in (1, 10):
+                with self.subTest(url=url, limit=limit):
+                    with self.assertNumQueries(2 if 'users' in url else 4):
+                        response = self.client.get(f'{url}?limit={limit}')
+                    self.assertEqual(
+                        len(response.json()['results']), limit)
+
+    def test_limit_is_capped(self):
+        with mock.patch.object(
+                LimitPageNumberPagination, 'max_page_size', 5):
+            response = self.client.get('/api/users/?limit=100000')
+        self.assertEqual(len(response.json()['results']), 5)
@@ -0,0 +1,88 @@
+from django.test import Client, TestCase
+from recipes.models import (Favourite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from rest_framework.authtoken.models import Token
+from user.models import User
+
+
+class RecipeQueryCountTest(TestCase):
+    """Количество запросов к БД не должно зависеть от числа рецептов."""
+    LIST_QUERIES = 4
+    SUBSCRIPTIONS_QUERIES = 1
+    RETRIEVE_QUERIES = 3
+    AUTH_QUERIES = 1
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@ai.ru')
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@ai.ru')
+        cls.token = Token.objects.create(user=cls.user)
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тэг {i}', slug=f'tag_{i}', color=f'#00000{i}')
+            for i in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.client = Client(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def create_recipes(self, count):
+        recipes = []
+        for i in range(Recipe.objects.count(), count):
+            recipe = Recipe.objects.create(
+                author=self.author,
+                name=f'Рецепт {i}',
+                text='Описание',
+                cooking_time=10,
+            )
+            recipe.tags.set(self.tags)
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe, ingredient=ingredient, amount=i + 1)
+                for ingredient in self.ingredients
+            )
+            Favourite.objects.create(user=self.user, recipe=recipe)
+            ShoppingCart.objects.create(user=self.user, recipe=recipe)
+            recipes.append(recipe)
+        return recipes
+
+    def test_list_query_count_does_not_depend_on_page_size(self):
+        for count in (1, 6):
+            self.create_recipes(count)
+            with self.subTest(recipes=count):
+                with self.assertNumQueries(self.LIST_QUERIES):
+                    self.guest_client.get('/api/recipes/')
+                with self.assertNumQueries(
+                        self.LIST_QUERIES + self.AUTH_QUERIES
+                        + self.SUBSCRIPTIONS_QUERIES):
+                    response = self.client.get('/api/recipes/')
+                results = response.json()['results']
+                self.assertEqual(len(results), count)
+                self.assertTrue(all(
+                    recipe['is_favorited'] and recipe['is_in_shopping_cart']
+                    for recipe in results
+                ))
+
+    def test_retrieve_query_count(self):
+        recipe, = self.create_recipes(1)
+        url = f'/api/recipes/{recipe.pk}/'
+        with self.assertNumQueries(self.RETRIEVE_QUERIES):
+            response = self.guest_client.get(url)
+        self.assertFalse(response.json()['is_favorited'])
+        with self.assertNumQueries(
+                self.RETRIEVE_QUERIES + self.AUTH_QUERIES
+                + self.SUBSCRIPTIONS_QUERIES):
+            response = self.client.get(url)
+        data = response.json()
+        self.assertTrue(data['is_favorited'])
+        self.assertTrue(data['is_in_shopping_cart'])
+        self.assertEqual(len(data['ingredients']), len(self.ingredients))
+        self.assertEqual(len(data['tags']), len(self.tags))
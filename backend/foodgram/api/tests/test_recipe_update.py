@@ -0,0 +1,124 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from recipes.models import (Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+                            ShoppingCartIngredient, Tag)
+from rest_framework.authtoken.models import Token
+from user.models import User
+
+
+class RecipeUpdateTest(TestCase):
+    """Изменение рецепта затрагивает только изменившиеся строки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@ai.ru')
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@ai.ru')
+        cls.token = Token.objects.create(user=cls.author)
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тэг {i}', slug=f'tag_{i}', color=f'#00000{i}')
+            for i in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(4)
+        ]
+
+    def setUp(self):
+        self.client = Client(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Описание',
+            cooking_time=10)
+        self.recipe.tags.set(self.tags[:2])
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=self.recipe, ingredient=ingredient,
+                             amount=10)
+            for ingredient in self.ingredients[:3]
+        )
+        ShoppingCart.objects.create(user=self.reader, recipe=self.recipe)
+        ShoppingCartIngredient.objects.rebuild()
+
+    def patch(self, data):
+        response = self.client.patch(
+            f'/api/recipes/{self.recipe.pk}/', data,
+            content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    def rows(self):
+        return dict(RecipeIngredient.objects.filter(
+            recipe=self.recipe).values_list('ingredient_id', 'id'))
+
+    def test_ingredients_are_diffed(self):
+        first, second, third, fourth = self.ingredients
+        before = self.rows()
+        self.patch({'ingredients': [
+            {'id': first.pk, 'amount': 10},
+            {'id': second.pk, 'amount': 25},
+            {'id': fourth.pk, 'amount': 5},
+        ]})
+        after = self.rows()
+        self.assertEqual(after[first.pk], before[first.pk])
+        self.assertEqual(after[second.pk], before[second.pk])
+        self.assertNotIn(third.pk, after)
+        self.assertEqual(
+            dict(RecipeIngredient.objects.filter(
+                recipe=self.recipe).values_list('ingredient_id', 'amount')),
+            {first.pk: 10, second.pk: 25, fourth.pk: 5})
+        self.assertEqual(
+            dict(ShoppingCartIngredient.objects.filter(
+                user=self.reader).values_list('ingredient_id', 'amount')),
+            {first.pk: 10, second.pk: 25, fourth.pk: 5})
+        call_command('rebuild_shopping_carts', verify=True, stdout=StringIO())
+
+    def test_repeated_ingredients_are_rejected(self):
+        ingredient = self.ingredients[0]
+        data = {
+            'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 10,
+            'tags': [self.tags[0].pk],
+            'ingredients': [{'id': ingredient.pk, 'amount': 32000},
+                            {'id': ingredient.pk, 'amount': 32000}],
+        }
+        for method, url in ((self.client.post, '/api/recipes/'),
+                            (self.client.patch,
+                             f'/api/recipes/{self.recipe.pk}/')):
+            with self.subTest(url=url):
+                response = method(url, {**data, 'name': url},
+                                  content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('ingredients', response.json())
+        self.assertEqual(self.recipe.recipe_ingredients.count(), 3)
+
+    def test_tags_are_diffed(self):
+        self.patch({'tags': [self.tags[1].pk, self.tags[2].pk]})
+        self.assertEqual(
+            set(self.recipe.tags.values_list('pk', flat=True)),
+            {self.tags[1].pk, self.tags[2].pk})
+
+    def test_unchanged_ingredients_are_not_written(self):
+        data = {
+            'name': 'Новое название',
+            'tags': [tag.pk for tag in self.tags[:2]],
+            'ingredients': [{'id': ingredient.pk, 'amount': 10}
+                            for ingredient in self.ingredients[:3]],
+        }
+        with CaptureQueriesContext(connection) as context:
+            self.patch(data)
+        tables = (RecipeIngredient._meta.db_table,
+                  Recipe.tags.through._meta.db_table,
+                  ShoppingCartIngredient._meta.db_table)
+        writes = [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+            and any(f'"{table}"' in query['sql'] for table in tables)
+        ]
+        self.assertEqual(writes, [])
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.name, 'Новое название')
@@ -0,0 +1,115 @@
+from unittest import mock
+
+from api.cache import get_reference_version
+from api.checks import check_shared_cache
+from api.serializers import Hex2NameColor
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from recipes.models import Ingredient, Recipe, Tag
+from user.models import User
+
+
+class ReferenceCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tag = Tag.objects.create(
+            name='Завтрак', slug='breakfast', color='#E26C2D')
+        Ingredient.objects.create(name='соль', measurement_unit='г')
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+
+    def test_cache_hit_skips_database(self):
+        for url in ('/api/tags/', f'/api/tags/{self.tag.pk}/',
+                    '/api/ingredients/'):
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                with self.assertNumQueries(0):
+                    second = self.client.get(url)
+                self.assertEqual(first.content, second.content)
+                self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_not_modified(self):
+        response = self.client.get('/api/tags/')
+        self.assertEqual(response.json()[0]['slug'], 'breakfast')
+        response = self.client.get(
+            '/api/tags/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(
+            '/api/tags/',
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_invalidate_cache(self):
+        etag = self.client.get('/api/tags/')['ETag']
+        self.tag.name = 'Обед'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tag.save()
+        response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['name'], 'Обед')
+
+    def test_nested_tags_follow_tag_changes(self):
+        author = User.objects.create_user(
+            username='author', email='author@ai.ru')
+        recipe = Recipe.objects.create(
+            author=author, name='Каша', text='Описание', cooking_time=10)
+        recipe.tags.add(self.tag)
+        url = f'/api/recipes/{recipe.pk}/'
+        self.assertEqual(self.client.get(url).json()['tags'][0]['name'],
+                         'Завтрак')
+        self.tag.name = 'Обед'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tag.save()
+        self.assertEqual(self.client.get(url).json()['tags'][0]['name'],
+                         'Обед')
+
+    def test_nested_tags_are_serialized_once_per_request(self):
+        author = User.objects.create_user(
+            username='author', email='author@ai.ru')
+        for name in ('Каша', 'Омлет', 'Сырники'):
+            Recipe.objects.create(
+                author=author, name=name, text='Описание',
+                cooking_time=10).tags.add(self.tag)
+        with mock.patch.object(
+                Hex2NameColor, 'to_representation',
+                autospec=True, side_effect=lambda field, value: value
+        ) as to_representation:
+            results = self.client.get('/api/recipes/').json()['results']
+        self.assertEqual(to_representation.call_count, 1)
+        self.assertEqual({recipe['tags'][0]['name'] for recipe in results},
+                         {'Завтрак'})
+
+    def test_version_changes_after_commit(self):
+        version = get_reference_version(Tag)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.tag.name = 'Обед'
+            self.tag.save()
+            self.assertEqual(get_reference_version(Tag), version)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_reference_version(Tag), version)
+
+    def test_key_ignores_unknown_params_and_case(self):
+        self.client.get('/api/ingredients/?name=Соль')
+        for url in ('/api/ingredients/?name=соль',
+                    '/api/ingredients/?name=СОЛЬ&_=123'):
+            with self.subTest(url=url), \
+                    mock.patch('api.views.ingredient_index') as index:
+                self.client.get(url)
+                index.search.assert_not_called()
+
+
+class SharedCacheCheckTest(TestCase):
+    @override_settings(DEBUG=False)
+    def test_locmem_cache_is_reported(self):
+        self.assertEqual(
+            [error.id for error in check_shared_cache(None)], ['api.W001'])
+
+    @override_settings(DEBUG=False, CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+        'LOCATION': 'memcached:11211',
+    }})
+    def test_shared_cache_passes(self):
+        self.assertEqual(check_shared_cache(None), [])
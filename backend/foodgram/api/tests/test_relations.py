@@ -0,0 +1,63 @@
+from django.db import IntegrityError, transaction
+from django.test import Client, TestCase
+from recipes.models import Favourite, Recipe, ShoppingCart
+from rest_framework.authtoken.models import Token
+from user.models import User
+
+
+class UserRecipeRelationTest(TestCase):
+    """Добавление в избранное и корзину: одна запись и один запрос."""
+    AUTH_QUERIES = 1
+    COUNTER_QUERIES = 1
+    # SAVEPOINT и RELEASE транзакции, общей для связи и счётчика.
+    TRANSACTION_QUERIES = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@ai.ru')
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@ai.ru')
+        cls.token = Token.objects.create(user=cls.user)
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Рецепт', text='Описание',
+            cooking_time=10)
+        cls.url = f'/api/recipes/{cls.recipe.pk}/favorite/'
+
+    def setUp(self):
+        self.client = Client(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def test_add_is_idempotent(self):
+        with self.assertNumQueries(self.AUTH_QUERIES + 1
+                                   + self.COUNTER_QUERIES
+                                   + self.TRANSACTION_QUERIES):
+            response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            Favourite.objects.filter(user=self.user).count(), 1)
+
+    def test_remove(self):
+        self.client.post(self.url)
+        with self.assertNumQueries(self.AUTH_QUERIES + 1
+                                   + self.COUNTER_QUERIES
+                                   + self.TRANSACTION_QUERIES):
+            response = self.client.delete(self.url)
+        self.assertEqual(response.status_code, 204)
+        response = self.client.delete(self.url)
+        self.assertEqual(response.status_code, 400)
+
+    def test_missing_recipe(self):
+        for method in (self.client.post, self.client.delete):
+            for url in ('/api/recipes/0/favorite/',
+                        '/api/recipes/0/shopping_cart/'):
+                with self.subTest(method=method.__name__, url=url):
+                    self.assertEqual(method(url).status_code, 404)
+
+    def test_database_rejects_duplicates(self):
+        for model in (Favourite, ShoppingCart):
+            model.objects.create(user=self.user, recipe=self.recipe)
+            with self.subTest(model=model.__name__):
+                with self.assertRaises(IntegrityError), transaction.atomic():
+                    model.objects.create(user=self.user, recipe=self.recipe)
@@ -0,0 +1,75 @@
+from django.test import Client, TestCase
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from rest_framework.authtoken.models import Token
+from user.models import User
+
+
+class RecipeSearchTest(TestCase):
+    """Поиск рецептов ?search= по названию, описанию и ингредиентам."""
+    URL = '/api/recipes/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@ai.ru')
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@ai.ru', password='admin')
+        cls.token = Token.objects.create(user=cls.author)
+        basil = Ingredient.objects.create(
+            name='базилик свежий', measurement_unit='г')
+        cls.in_text = cls.create_recipe('Паста', 'Добавить базилик в конце')
+        cls.in_ingredients = cls.create_recipe('Салат', 'Нарезать', basil)
+        cls.in_name = cls.create_recipe('Томаты с базиликом', 'Смешать')
+        cls.create_recipe('Омлет', 'Взбить яйца')
+
+    @classmethod
+    def create_recipe(cls, name, text, ingredient=None):
+        recipe = Recipe.objects.create(
+            author=cls.author, name=name, text=text, cooking_time=10)
+        if ingredient is not None:
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=10)
+        return recipe
+
+    def setUp(self):
+        self.client = Client(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def search(self, query):
+        response = self.client.get(self.URL, {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_search_matches_name_text_and_ingredients(self):
+        found = self.search('базилик')
+        self.assertEqual(
+            set(found),
+            {self.in_name.pk, self.in_text.pk, self.in_ingredients.pk})
+
+    def test_name_matches_rank_first(self):
+        self.assertEqual(self.search('базилик')[0], self.in_name.pk)
+
+    def test_explicit_ordering_overrides_rank(self):
+        response = self.client.get(
+            self.URL, {'search': 'базилик', 'ordering': 'cooking_time'})
+        found = [recipe['id'] for recipe in response.json()['results']]
+        self.assertEqual(found, sorted(found))
+
+    def test_cursor_is_rejected_with_rank_ordering(self):
+        response = self.client.get(
+            self.URL, {'search': 'базилик', 'cursor': ''})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(self.URL, {
+            'search': 'базилик', 'ordering': 'cooking_time', 'cursor': ''})
+        self.assertEqual(response.status_code, 200)
+
+    def test_nothing_found(self):
+        self.assertEqual(self.search('трюфель'), [])
+
+    def test_admin_search(self):
+        client = Client()
+        client.force_login(self.admin)
+        response = client.get('/admin/recipes/recipe/', {'q': 'базилик'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {recipe.pk for recipe in response.context['cl'].result_list},
+            {self.in_name.pk, self.in_text.pk, self.in_ingredients.pk})
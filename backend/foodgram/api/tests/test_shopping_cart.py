@@ -0,0 +1,143 @@
+import json
+from io import StringIO
+
+from api.renderers import get_pdf_font
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.test import Client, TestCase, override_settings
+from recipes.models import (Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+                            ShoppingCartIngredient)
+from rest_framework.authtoken.models import Token
+from user.models import User
+
+
+class ShoppingCartDownloadTest(TestCase):
+    URL = '/api/recipes/download_shopping_cart/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='buyer', email='buyer@ai.ru')
+        cls.token = Token.objects.create(user=cls.user)
+        cls.salt = Ingredient.objects.create(
+            name='соль', measurement_unit='г')
+        cls.milk = Ingredient.objects.create(
+            name='молоко', measurement_unit='мл')
+        for i, (salt, milk) in enumerate(((5, 200), (10, 300))):
+            recipe = Recipe.objects.create(
+                author=cls.user, name=f'Рецепт {i}',
+                text='Описание', cooking_time=10)
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=cls.salt, amount=salt)
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=cls.milk, amount=milk)
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        ShoppingCartIngredient.objects.rebuild()
+
+    def setUp(self):
+        self.client = Client(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def download(self, url=URL):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_shopping_cart_is_aggregated_in_single_query(self):
+        with self.assertNumQueries(2):
+            content = self.download()
+        self.assertEqual(
+            content,
+            'СПИСОК ИНГРЕДИЕНТОВ\n\n'
+            '1. молоко (мл) - 500\n'
+            '2. соль (г) - 15\n'
+        )
+
+    def test_shopping_cart_formats(self):
+        self.assertEqual(
+            self.download(self.URL + '?format=csv'),
+            'name,measurement_unit,amount\r\n'
+            'молоко,мл,500\r\n'
+            'соль,г,15\r\n'
+        )
+        self.assertEqual(
+            json.loads(self.download(self.URL + '?format=json')),
+            [{'name': 'молоко', 'measurement_unit': 'мл', 'amount': 500},
+             {'name': 'соль', 'measurement_unit': 'г', 'amount': 15}]
+        )
+        response = self.client.get(self.URL + '?format=pdf')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(
+            b''.join(response.streaming_content).startswith(b'%PDF'))
+        response = self.client.get(self.URL + '?format=xml')
+        self.assertEqual(response.status_code, 404)
+
+    def test_json_errors_are_json(self):
+        response = Client().get(self.URL + '?format=json')
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('detail', json.loads(response.content))
+
+    @override_settings(SHOPPING_LIST_PDF_FONT='/nonexistent/font.ttf')
+    def test_pdf_without_cyrillic_font_fails(self):
+        get_pdf_font.cache_clear()
+        self.addCleanup(get_pdf_font.cache_clear)
+        with self.assertLogs('api.renderers', 'ERROR'), \
+                self.assertRaises(ImproperlyConfigured):
+            self.client.get(self.URL + '?format=pdf')
+
+
+class ShoppingCartTotalsTest(TestCase):
+    """Итоги списка покупок обновляются инкрементально."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='buyer', email='buyer@ai.ru')
+        cls.token = Token.objects.create(user=cls.user)
+        cls.salt = Ingredient.objects.create(
+            name='соль', measurement_unit='г')
+        cls.milk = Ingredient.objects.create(
+            name='молоко', measurement_unit='мл')
+        cls.recipes = []
+        for i in range(2):
+            recipe = Recipe.objects.create(
+                author=cls.user, name=f'Рецепт {i}',
+                text='Описание', cooking_time=10)
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=cls.salt, amount=5)
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        self.client = Client(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def totals(self):
+        return dict(ShoppingCartIngredient.objects.filter(
+            user=self.user).values_list('ingredient__name', 'amount'))
+
+    def test_totals_follow_shopping_cart_changes(self):
+        first, second = self.recipes
+        for recipe in self.recipes:
+            self.client.post(f'/api/recipes/{recipe.pk}/shopping_cart/')
+        self.assertEqual(self.totals(), {'соль': 10})
+
+        response = self.client.patch(
+            f'/api/recipes/{first.pk}/',
+            {'ingredients': [{'id': self.salt.pk, 'amount': 1},
+                             {'id': self.milk.pk, 'amount': 100}]},
+            content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.totals(), {'соль': 6, 'молоко': 100})
+
+        self.client.delete(f'/api/recipes/{second.pk}/shopping_cart/')
+        self.assertEqual(self.totals(), {'соль': 1, 'молоко': 100})
+
+        self.client.delete(f'/api/recipes/{first.pk}/')
+        self.assertEqual(self.totals(), {})
+        call_command('rebuild_shopping_carts', verify=True, stdout=StringIO())
+
+    def test_verify_detects_stale_totals(self):
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipes[0])
+        with self.assertRaises(CommandError):
+            call_command(
+                'rebuild_shopping_carts', verify=True, stdout=StringIO())
+        call_command('rebuild_shopping_carts', stdout=StringIO())
+        self.assertEqual(self.totals(), {'соль': 5})
@@ -0,0 +1,84 @@
+from django.test import Client, TestCase
+from recipes.models import Recipe
+from rest_framework.authtoken.models import Token
+from user.models import User
+
+
+class SubscriptionsTest(TestCase):
+    URL = '/api/users/subscriptions/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='follower', email='follower@ai.ru')
+        cls.token = Token.objects.create(user=cls.user)
+        cls.authors = []
+        for i in range(4):
+            author = User.objects.create_user(
+                username=f'author_{i}', email=f'author_{i}@ai.ru')
+            for j in range(i + 1):
+                Recipe.objects.create(
+                    author=author, name=f'Рецепт {j}',
+                    text='Описание', cooking_time=10)
+            cls.authors.append(author)
+
+    def setUp(self):
+        self.client = Client(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def subscribe(self, authors):
+        for author in authors:
+            response = self.client.post(f'/api/users/{author.pk}/subscribe/')
+            self.assertEqual(response.status_code, 201)
+
+    def test_query_count_does_not_depend_on_authors(self):
+        subscribed = 0
+        for count in (1, 4):
+            self.subscribe(self.authors[subscribed:count])
+            subscribed = count
+            for limit in ('', '&recipes_limit=1', '&recipes_limit=3'):
+                with self.subTest(authors=count, limit=limit):
+                    with self.assertNumQueries(4):
+                        response = self.client.get(
+                            f'{self.URL}?limit=10{limit}')
+                    self.assertEqual(
+                        len(response.json()['results']), count)
+
+    def test_recipes_limit(self):
+        self.subscribe(self.authors)
+        response = self.client.get(self.URL + '?limit=10&recipes_limit=2')
+        results = {author['username']: author
+                   for author in response.json()['results']}
+        for author in self.authors:
+            data = results[author.username]
+            count = author.recipes.count()
+            self.assertEqual(data['recipes_count'], count)
+            self.assertEqual(
+                [recipe['name'] for recipe in data['recipes']],
+                [f'Рецепт {j}' for j in reversed(range(count))][:2])
+
+    def test_invalid_recipes_limit(self):
+        for recipes_limit in ('abc', '²', '٣', '３'):
+            with self.subTest(recipes_limit=recipes_limit):
+                response = self.client.get(
+                    self.URL, {'recipes_limit': recipes_limit})
+                self.assertEqual(response.status_code, 400)
+
+    def test_is_subscribed_is_per_follower(self):
+        author = self.authors[0]
+        self.subscribe([author])
+        other = User.objects.create_user(
+            username='other', email='other@ai.ru')
+        other_client = Client(HTTP_AUTHORIZATION='Token ' + Token.objects
+                              .create(user=other).key)
+        url = f'/api/users/{author.pk}/'
+        self.assertTrue(self.client.get(url).json()['is_subscribed'])
+        self.assertFalse(other_client.get(url).json()['is_subscribed'])
+        self.assertFalse(Client().get(url).json()['is_subscribed'])
+        self.assertEqual(
+            other_client.get(self.URL).json()['results'], [])
+
+        response = self.client.delete(f'/api/users/{author.pk}/subscribe/')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(self.client.get(url).json()['is_subscribed'])
+        response = self.client.delete(f'/api/users/{author.pk}/subscribe/')
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,75 @@
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from recipes.models import Favourite, Recipe, Tag
+from rest_framework.authtoken.models import Token
+from user.models import User
+
+
+class TagFilterTest(TestCase):
+    """Фильтрация рецептов по нескольким тэгам."""
+    URL = '/api/recipes/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='user', email='user@ai.ru')
+        cls.token = Token.objects.create(user=cls.user)
+        cls.breakfast, cls.lunch, cls.dinner = (
+            Tag.objects.create(name=slug, slug=slug, color=f'#00000{i}')
+            for i, slug in enumerate(('breakfast', 'lunch', 'dinner'))
+        )
+        cls.both = cls.create_recipe('Омлет', cls.breakfast, cls.lunch)
+        cls.lunch_only = cls.create_recipe('Суп', cls.lunch)
+        cls.dinner_only = cls.create_recipe('Рагу', cls.dinner)
+        Favourite.objects.create(user=cls.user, recipe=cls.both)
+
+    @classmethod
+    def create_recipe(cls, name, *tags):
+        recipe = Recipe.objects.create(
+            author=cls.user, name=name, text='Описание', cooking_time=10)
+        recipe.tags.set(tags)
+        return recipe
+
+    def setUp(self):
+        self.client = Client(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def filter(self, **params):
+        response = self.client.get(self.URL, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_any_tag(self):
+        found = self.filter(tags=['breakfast', 'lunch'])
+        self.assertEqual(found, [self.lunch_only.pk, self.both.pk])
+
+    def test_all_tags(self):
+        self.assertEqual(
+            self.filter(tags=['breakfast', 'lunch'], tags_mode='all'),
+            [self.both.pk])
+        self.assertEqual(
+            self.filter(tags=['lunch', 'dinner'], tags_mode='all'), [])
+
+    def test_tags_with_favorites(self):
+        self.assertEqual(
+            self.filter(tags=['breakfast', 'lunch'], is_favorited=1),
+            [self.both.pk])
+
+    def test_invalid_mode(self):
+        response = self.client.get(
+            self.URL, {'tags': 'lunch', 'tags_mode': 'some'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_no_distinct(self):
+        with CaptureQueriesContext(connection) as context:
+            self.filter(tags=['breakfast', 'lunch'])
+        self.assertFalse(any('DISTINCT' in query['sql']
+                             for query in context.captured_queries))
+
+    def test_tag_recipe_index(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, Recipe.tags.through._meta.db_table)
+        self.assertIn(['tag_id', 'recipe_id'], [
+            constraint['columns'] for constraint in constraints.values()
+            if constraint['index']])
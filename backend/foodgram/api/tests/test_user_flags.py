@@ -0,0 +1,84 @@
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from recipes.models import Favourite, Recipe, ShoppingCart, Tag
+from rest_framework.authtoken.models import Token
+from user.models import User
+
+
+class UserFlagFilterTest(TestCase):
+    """Фильтры ?is_favorited= и ?is_in_shopping_cart=."""
+    URL = '/api/recipes/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.other = (
+            User.objects.create_user(username=name, email=f'{name}@ai.ru')
+            for name in ('user', 'other')
+        )
+        cls.token = Token.objects.create(user=cls.user)
+        tags = [Tag.objects.create(name=slug, slug=slug, color=f'#00000{i}')
+                for i, slug in enumerate(('breakfast', 'lunch'))]
+        cls.favorite, cls.in_cart, cls.plain = (
+            Recipe.objects.create(
+                author=cls.other, name=name, text='Описание',
+                cooking_time=10)
+            for name in ('Омлет', 'Суп', 'Рагу')
+        )
+        cls.favorite.tags.set(tags)
+        for user in (cls.user, cls.other):
+            Favourite.objects.create(user=user, recipe=cls.favorite)
+        ShoppingCart.objects.create(user=cls.user, recipe=cls.in_cart)
+
+    def setUp(self):
+        self.client = Client(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def filter(self, client=None, **params):
+        response = (client or self.client).get(self.URL, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return {recipe['id'] for recipe in response.json()['results']}
+
+    def test_flags_respect_value(self):
+        everything = {self.favorite.pk, self.in_cart.pk, self.plain.pk}
+        self.assertEqual(self.filter(is_favorited=1), {self.favorite.pk})
+        self.assertEqual(self.filter(is_favorited=0),
+                         everything - {self.favorite.pk})
+        self.assertEqual(self.filter(is_in_shopping_cart=1),
+                         {self.in_cart.pk})
+        self.assertEqual(self.filter(is_in_shopping_cart=0),
+                         everything - {self.in_cart.pk})
+        self.assertEqual(
+            self.filter(is_favorited=0, is_in_shopping_cart=0),
+            {self.plain.pk})
+
+    def test_anonymous(self):
+        self.assertEqual(self.filter(Client(), is_favorited=1), set())
+        self.assertEqual(len(self.filter(Client(), is_in_shopping_cart=0)), 3)
+
+    def test_invalid_value(self):
+        response = self.client.get(self.URL, {'is_favorited': 2})
+        self.assertEqual(response.status_code, 400)
+
+    def test_no_duplicates_with_tags(self):
+        response = self.client.get(self.URL, {
+            'is_favorited': 1, 'tags': ['breakfast', 'lunch']})
+        self.assertEqual(
+            [recipe['id'] for recipe in response.json()['results']],
+            [self.favorite.pk])
+        self.assertEqual(response.json()['count'], 1)
+
+    def test_filter_uses_exists(self):
+        with CaptureQueriesContext(connection) as context:
+            self.filter(is_favorited=1)
+        table = Favourite._meta.db_table
+        for query in context.captured_queries:
+            self.assertNotIn(f'JOIN "{table}"', query['sql'])
+
+    def test_user_recipe_indexes(self):
+        for model in (Favourite, ShoppingCart):
+            with connection.cursor() as cursor:
+                constraints = connection.introspection.get_constraints(
+                    cursor, model._meta.db_table)
+            self.assertIn(['user_id', 'recipe_id'], [
+                constraint['columns'] for constraint in constraints.values()
+                if constraint['index'] or constraint['unique']])
@@ -1,22 +1,43 @@
-from django.http import HttpResponse
+import re
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (BooleanField, Count, Exists, F, OuterRef,
+                              Prefetch, Value)
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.serializers import SetPasswordSerializer
+from recipes.counters import FAVORITES, IN_CARTS, change_counter
 from recipes.models import (Favourite, Follow, Ingredient, Recipe,
-                            RecipeIngredient, ShoppingCart, Tag)
+                            ShoppingCart, ShoppingCartIngredient, Tag)
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
 from rest_framework.validators import ValidationError
 from user.models import User
 
+from .autocomplete import ingredient_index
+from .cache import cached_reference
+from .cookable import cookable_index
 from .filters import IngredientFilter, RecipeFilter
+from .mixins import ADDED, REMOVED, UserRecipeRelationMixin
+from .pagination import FeedPagination, RecipePagination
+from .parsers import MultiPartJSONParser
 from .permissions import IsAdminOrReadOnly, IsAuthor, IsAuthorOrAdmin, ReadOnly
-from .serializers import (FollowSerializer, IngredientSerializer,
-                          ListRecipeSerializer, RecipeSerializer,
+from .renderers import (CSVShoppingListRenderer, JSONShoppingListRenderer,
+                        PDFShoppingListRenderer, TextShoppingListRenderer)
+from .serializers import (CookableRecipeSerializer, FollowSerializer,
+                          IngredientSerializer, ListRecipeSerializer,
+                          RecipeIdsSerializer, RecipeSerializer,
                           SubscriptionsSerializer, TagSerializer,
                           UserRegistrationSerializer, UserSerializer)
 
+# Целое число из цифр 0-9: str.isdigit() и isdecimal() пропускают
+# и другие цифры Юникода
+NUMBER = re.compile(r'[0-9]+')
+
 
 class TagView(viewsets.ModelViewSet):
     """Метод для получения списка тэгов"""
@@ -25,6 +46,14 @@ class TagView(viewsets.ModelViewSet):
     permission_classes = [permissions.AllowAny]
     pagination_class = None
 
+    @cached_reference(Tag)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cached_reference(Tag)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
 class IngredientView(viewsets.ModelViewSet):
     """Метод для получения списка ингредиентов"""
@@ -36,12 +65,43 @@ class IngredientView(viewsets.ModelViewSet):
     filterset_class = IngredientFilter
     search_fields = ('^name',)
 
+    @cached_reference(Ingredient)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @cached_reference(Ingredient, params=('name', 'limit'))
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        limit = self.get_limit()
+        if name and settings.INGREDIENT_INDEX_ENABLED:
+            return Response(ingredient_index.search(name, limit))
+        if limit is None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())[:limit]
+        return Response(self.get_serializer(queryset, many=True).data)
+
+    def get_limit(self):
+        limit = self.request.query_params.get('limit')
+        if limit is None:
+            return None
+        if not NUMBER.fullmatch(limit) or int(limit) < 1:
+            raise ValidationError(
+                {'limit': 'Должно быть целым положительным числом.'})
+        return min(int(limit), settings.INGREDIENT_SEARCH_MAX_LIMIT)
+
 
 class UserView(viewsets.ModelViewSet):
     """Метод для модели пользователя"""
-    queryset = User.objects.all()
     permission_classes = [IsAdminOrReadOnly]
 
+    def get_queryset(self):
+        user = self.request.user
+        if not user.is_authenticated:
+            return User.objects.annotate(
+                is_subscribed=Value(False, output_field=BooleanField()))
+        return User.objects.annotate(is_subscribed=Exists(
+            Follow.objects.filter(user=user, author=OuterRef('pk'))))
+
     def get_permissions(self):
         if self.action == 'retrieve' or self.action == 'list':
             return (ReadOnly(),)
@@ -90,7 +150,26 @@ class SubscriptionsView(viewsets.ModelViewSet):
     http_method_names = ['get']
 
     def get_queryset(self):
-        return User.objects.filter(is_subscribed=True)
+        authors = User.objects.filter(following__user=self.request.user)
+        recipes_limit = self.get_recipes_limit()
+        recipes = Recipe.objects.filter(author__in=authors)
+        if recipes_limit is not None:
+            recipes = recipes.latest_per_author(recipes_limit)
+        return authors.annotate(
+            recipes_count=Count('recipes'),
+            is_subscribed=Value(True, output_field=BooleanField())
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes)
+        ).order_by('id')
+
+    def get_recipes_limit(self):
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        if recipes_limit is None:
+            return None
+        if not NUMBER.fullmatch(recipes_limit) or int(recipes_limit) < 1:
+            raise ValidationError(
+                {'recipes_limit': 'Должно быть целым положительным числом.'})
+        return int(recipes_limit)
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
@@ -110,34 +189,37 @@ class FollowView(viewsets.ModelViewSet):
 
     def delete(self, serializer, *args, **kwargs):
         author = get_object_or_404(User, id=self.kwargs.get('user_id'))
-        if (
-                self.request.method == 'DELETE'
-                and not self.request.user.follower.filter(
-                    author=author).exists()
-        ):
-            setattr(author, 'is_subscribed', False)
-            author.save()
+        deleted, _ = Follow.objects.filter(
+            user=self.request.user, author=author).delete()
+        if not deleted:
             return Response(
                 {'detail': 'Вы не подписаны на этого пользователя.'},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        follow = get_object_or_404(
-            Follow, user=self.request.user, author=author)
-        follow.delete()
-        setattr(author, 'is_subscribed', False)
-        author.save()
         return Response('Успешная отписка', status=status.HTTP_204_NO_CONTENT)
 
 
-class RecipeView(viewsets.ModelViewSet):
-    queryset = Recipe.objects.all()
+class RecipeView(UserRecipeRelationMixin, viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated, IsAuthorOrAdmin]
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    pagination_class = RecipePagination
+    parser_classes = (JSONParser, MultiPartJSONParser)
+    multipart_json_fields = ('ingredients', 'tags')
+
+    def get_queryset(self):
+        return Recipe.objects.defer('search_vector').with_related(
+        ).with_user_flags(self.request.user)
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        # Представления тэгов, общие для рецептов в ответе на запрос
+        context['tag_representations'] = {}
+        return context
+
     def get_permissions(self):
         if self.action == 'retrieve' or self.action == 'list':
             return (ReadOnly(),)
@@ -148,118 +230,202 @@ class RecipeView(viewsets.ModelViewSet):
             return ListRecipeSerializer
         return RecipeSerializer
 
+    def apply_relation_changes(self, model, recipe_ids, sign):
+        """Обновляет счётчики рецептов и, для корзины,
+        итоги списка покупок после добавления или удаления.
+        Вызывается в той же транзакции, что и изменение связей."""
+        if model is ShoppingCart:
+            ShoppingCartIngredient.objects.apply_recipes(
+                recipe_ids, user_id=self.request.user.pk, sign=sign)
+            change_counter(IN_CARTS, recipe_ids, sign)
+        else:
+            change_counter(FAVORITES, recipe_ids, sign)
+
+    @transaction.atomic
+    def change_relations(self, request, model):
+        """Массовое добавление (POST) или удаление (DELETE) рецептов
+        из тела запроса {"recipes": [id, ...]} с ответом по каждому id."""
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        if request.method == 'POST':
+            statuses = self.add_relations(model, recipe_ids)
+            done, sign = ADDED, 1
+        else:
+            statuses = self.remove_relations(model, recipe_ids)
+            done, sign = REMOVED, -1
+        changed = [pk for pk, status in statuses.items() if status == done]
+        if changed:
+            self.apply_relation_changes(model, changed, sign)
+        return Response({'recipes': [
+            {'id': pk, 'status': status} for pk, status in statuses.items()
+        ]})
+
+    @action(
+        detail=False,
+        url_path='feed',
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def feed(self, request):
+        """Лента рецептов авторов, на которых подписан пользователь,
+        от новых к старым с постраничным переходом по ?cursor=."""
+        paginator = FeedPagination()
+        recipes = paginator.paginate_feed(self.get_queryset(), request)
+        serializer = ListRecipeSerializer(
+            recipes, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        url_path='cookable',
+        permission_classes=[permissions.AllowAny],
+    )
+    def cookable(self, request):
+        """Рецепты, которые можно приготовить из ингредиентов
+        ?ingredients=1&ingredients=2: сначала те, для которых есть
+        наибольшая доля ингредиентов. Ищет по индексу в памяти."""
+        ingredient_ids = request.query_params.getlist('ingredients')
+        if not ingredient_ids or not all(
+                NUMBER.fullmatch(pk) for pk in ingredient_ids):
+            raise ValidationError(
+                {'ingredients': 'Укажите id имеющихся ингредиентов.'})
+        if len(ingredient_ids) > settings.COOKABLE_INGREDIENTS_MAX:
+            raise ValidationError({'ingredients': (
+                f'Не больше {settings.COOKABLE_INGREDIENTS_MAX} '
+                f'ингредиентов.')})
+        limit = request.query_params.get('limit')
+        if limit is None:
+            limit = settings.COOKABLE_RESULTS_MAX
+        elif not NUMBER.fullmatch(limit) or int(limit) < 1:
+            raise ValidationError(
+                {'limit': 'Должно быть целым положительным числом.'})
+        limit = min(int(limit), settings.COOKABLE_RESULTS_MAX)
+        found = cookable_index.search(map(int, ingredient_ids), limit)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _ in found])
+        results = []
+        for recipe_id, coverage in found:
+            if recipe_id in recipes:
+                recipes[recipe_id].coverage = coverage
+                results.append(recipes[recipe_id])
+        serializer = CookableRecipeSerializer(
+            results, many=True, context=self.get_serializer_context())
+        return Response(serializer.data)
+
     @action(
         detail=True,
         methods=['post', 'delete'],
         url_path='favorite',
         permission_classes=[permissions.IsAuthenticated],
     )
+    @transaction.atomic
     def favorite_recipe(self, request, pk=None):
         """Метод добавления и удаления рецепта из избранного."""
-        recipe = self.get_object()
-        user = request.user
-
         if request.method == 'POST':
-            if user.favorites.filter(recipe=recipe).exists():
+            if not self.add_relation(Favourite):
                 return Response(
                     {'detail': 'Рецепт уже добавлен в избранное.'},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-            Favourite.objects.create(user=user, recipe=recipe)
+            self.apply_relation_changes(
+                Favourite, [self.get_recipe_id()], 1)
             return Response(
                 {'detail': 'Рецепт успешно добавлен в избранное.'},
                 status=status.HTTP_201_CREATED,
             )
-        elif (
-                request.method == 'DELETE'
-                and not request.user.favorites.filter(recipe=recipe).exists()
-        ):
+        if not self.remove_relation(Favourite):
             return Response(
                 {'detail': 'Рецепт не был добавлен в избранное'
                  ' Его нельзя удалить.'},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        favourite = get_object_or_404(
-            Favourite, user=self.request.user, recipe=recipe)
-        favourite.delete()
+        self.apply_relation_changes(Favourite, [self.get_recipe_id()], -1)
         return Response(
             {'detail': 'Рецепт успешно удален из избранного.'},
             status=status.HTTP_204_NO_CONTENT,
         )
 
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='favorite',
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def favorite_recipes(self, request):
+        """Метод добавления и удаления нескольких рецептов
+        из избранного одним запросом."""
+        return self.change_relations(request, Favourite)
+
     @action(
         detail=True,
         methods=['post', 'delete'],
         url_path='shopping_cart',
         permission_classes=[permissions.IsAuthenticated],
     )
+    @transaction.atomic
     def shopping_cart(self, request, pk=None) -> Response:
         """Метод добавления/удаления рецепта из корзины покупок."""
-        recipe = self.get_object()
-        user = request.user
-
         if request.method == 'POST':
-            if user.shopping_cart.filter(recipe=recipe).exists():
+            if not self.add_relation(ShoppingCart):
                 return Response(
                     {'detail': 'Этот рецепт уже в списке покупок!'},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
-            ShoppingCart.objects.create(user=user, recipe=recipe)
+            self.apply_relation_changes(
+                ShoppingCart, [self.get_recipe_id()], 1)
             return Response(
                 {'detail': 'Рецепт успешно добавлен в корзину покупок.'},
                 status=status.HTTP_201_CREATED,
             )
-        elif (
-                request.method == 'DELETE'
-                and not self.request.user.shopping_cart.filter(
-                    recipe=recipe).exists()
-        ):
+        if not self.remove_relation(ShoppingCart):
             return Response(
                 {'detail': 'Рецепт не был добавлен в корзину покупок.'
                  ' Его нельзя удалить.'},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        shopping_cart = get_object_or_404(
-            ShoppingCart, user=self.request.user, recipe=recipe)
-        shopping_cart.delete()
+        self.apply_relation_changes(ShoppingCart, [self.get_recipe_id()], -1)
         return Response(
             {'detail': 'Рецепт успешно удалён из списка покупок!'},
             status=status.HTTP_204_NO_CONTENT,
         )
 
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='shopping_cart',
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def shopping_cart_recipes(self, request):
+        """Метод добавления/удаления нескольких рецептов
+        из корзины покупок одним запросом."""
+        return self.change_relations(request, ShoppingCart)
+
 
 class GetShoppingCartView(viewsets.ModelViewSet):
+    """Выгрузка списка покупок в формате, заданном
+    параметром ?format= (txt, csv, json, pdf)"""
     http_method_names = ['get']
     permission_classes = [permissions.IsAuthenticated, IsAuthor]
+    renderer_classes = (TextShoppingListRenderer, CSVShoppingListRenderer,
+                        JSONShoppingListRenderer, PDFShoppingListRenderer)
 
     def list(self, request):
-        shopping_list = ShoppingCart.objects.filter(user=self.request.user)
-        shopping_dict = {}
-        measure_dict = {}
-        for cart in shopping_list:
-            for ingredient in cart.recipe.ingredients.all():
-                recipe_ingredient = get_object_or_404(
-                    RecipeIngredient, recipe=cart.recipe,
-                    ingredient=ingredient)
-                amount = recipe_ingredient.amount
-                if ingredient.name not in shopping_dict.keys():
-                    shopping_dict[ingredient.name] = amount
-                    measure_dict[ingredient.name] = ingredient.measurement_unit
-                else:
-                    shopping_dict[ingredient.name] += amount
-
-        filename = 'get_shopping_cart.txt'
-        list = []
-        list.append('СПИСОК ИНГРЕДИЕНТОВ\n')
-        list.append('\n')
-        count = 0
-        for ingredient, amount in shopping_dict.items():
-            count += 1
-            string = (f'{count}. {ingredient} ({measure_dict[ingredient]}) '
-                      f'- {amount}\n')
-            list.append(string)
-
-        response = HttpResponse(list, content_type='text/plain')
+        ingredients = ShoppingCartIngredient.objects.filter(
+            user=request.user
+        ).values(
+            name=F('ingredient__name'),
+            measurement_unit=F('ingredient__measurement_unit'),
+            total_amount=F('amount')
+        ).order_by('name')
+
+        renderer = request.accepted_renderer
+        filename = f'get_shopping_cart.{renderer.format}'
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type += f'; charset={renderer.charset}'
+        response = StreamingHttpResponse(
+            renderer.stream(ingredients.iterator()),
+            content_type=content_type)
         response['Content-Disposition'] = (
             'attachment; filename={0}'.format(filename))
         return response
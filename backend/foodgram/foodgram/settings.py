@@ -77,6 +77,18 @@ DATABASES = {
 }
 
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+REFERENCE_CACHE_ALIAS = 'default'
+REFERENCE_CACHE_TIMEOUT = 60 * 60 * 24
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -119,9 +131,61 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Уменьшенные WebP-варианты изображений рецептов: имя и ширина
+RECIPE_IMAGE_VARIANTS = {'thumbnail': 320, 'medium': 800}
+RECIPE_IMAGE_QUALITY = 80
+RECIPE_IMAGE_WORKERS = 2
+RECIPE_IMAGE_MAX_SIZE = 5 * 1024 * 1024
+RECIPE_IMAGE_MAX_PIXELS = 40_000_000
+# Освободившиеся изображения моложе стольких секунд удаляет
+# только collect_image_garbage
+RECIPE_IMAGE_MIN_AGE = 10 * 60
+
 QUANTITY_MIN = 1
 QUANTITY_MAX = 32000
 
+MAX_PAGE_SIZE = 100
+
+# Сколько рецептов можно добавить в избранное или корзину одним запросом
+BULK_RECIPES_MAX = 100
+
+# Счётчики избранного и корзин копятся в памяти и записываются пачками
+RECIPE_COUNTERS_BUFFERED = (
+    os.getenv('RECIPE_COUNTERS_BUFFERED', 'False') == 'True')
+RECIPE_COUNTERS_FLUSH_INTERVAL = 5
+RECIPE_COUNTERS_FLUSH_SIZE = 100
+
+# Лента подписок: рецепты авторов, у которых подписчиков больше
+# FEED_FANOUT_MAX_FOLLOWERS, не рассылаются, а читаются при запросе
+FEED_FANOUT_MAX_FOLLOWERS = 5000
+FEED_FANOUT_BATCH_SIZE = 1000
+# Сколько последних рецептов автора попадает в ленту при подписке
+FEED_BACKFILL_SIZE = 100
+
+# Окно и период полураспада для сортировки ?ordering=trending
+TRENDING_WINDOW_DAYS = 30
+TRENDING_HALF_LIFE_HOURS = 72
+
+# Конфигурация полнотекстового поиска рецептов PostgreSQL (?search=)
+RECIPE_SEARCH_CONFIG = 'russian'
+
+INGREDIENT_INDEX_ENABLED = True
+INGREDIENT_SEARCH_MAX_LIMIT = 100
+
+# Поиск рецептов по имеющимся ингредиентам (/api/recipes/cookable/):
+# максимум ингредиентов в запросе и рецептов в ответе, число изменений
+# из журнала, после которого индекс строится заново, и сколько секунд
+# индекс ждёт незафиксированную запись перед пропуском в номерах журнала
+COOKABLE_INGREDIENTS_MAX = 100
+COOKABLE_RESULTS_MAX = 100
+COOKABLE_INDEX_MAX_CHANGES = 1000
+COOKABLE_INDEX_GAP_TIMEOUT = 10
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
 AUTH_USER_MODEL = 'user.User'
 
 DJOSER = {
@@ -142,7 +206,7 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.TokenAuthentication',
     ],
 
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.LimitPageNumberPagination',
     'PAGE_SIZE': 6,
 
 }
@@ -10,7 +10,16 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/wsgi/
 import os
 
 from django.core.wsgi import get_wsgi_application
+from django.db import DatabaseError
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
 
 application = get_wsgi_application()
+
+try:
+    from api.autocomplete import ingredient_index
+    ingredient_index.build()
+except DatabaseError:
+    # База ещё не готова (например, до миграций): индекс
+    # будет построен при первом запросе.
+    pass
@@ -1,7 +1,8 @@
 from django.contrib import admin
 
 from .models import (Favourite, Follow, Ingredient, Recipe, RecipeIngredient,
-                     ShoppingCart, Tag)
+                     ShoppingCart, ShoppingCartIngredient, Tag)
+from .signals import recipe_ingredients_changed
 
 
 class RecipeIngredientInLine(admin.TabularInline):
@@ -21,9 +22,22 @@ class RecipeAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
     inlines = (RecipeIngredientInLine, )
 
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по тому же индексу, что и ?search= в API."""
+        if not search_term:
+            return queryset, False
+        return queryset.search(search_term), False
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        Recipe.objects.filter(
+            pk=form.instance.pk).update_search_vectors()
+        recipe_ingredients_changed.send(
+            sender=Recipe, recipe_ids=[form.instance.pk])
+
+    @admin.display(description='В избранном', ordering='favorites_count')
     def fav_count(self, obj):
-        recipe = Recipe.objects.get(id=obj.id)
-        return recipe.favors.count()
+        return obj.favorites_count
 
 
 class FollowAdmin(admin.ModelAdmin):
@@ -56,6 +70,17 @@ class ShoppingCartAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
+class ShoppingCartIngredientAdmin(admin.ModelAdmin):
+    list_display = (
+        'id',
+        'user',
+        'ingredient',
+        'amount'
+    )
+    list_filter = ('user',)
+    empty_value_display = '-пусто-'
+
+
 class IngredientAdmin(admin.ModelAdmin):
     list_display = (
         'id',
@@ -79,6 +104,7 @@ admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(Favourite, FavouriteAdmin)
 admin.site.register(ShoppingCart, ShoppingCartAdmin)
+admin.site.register(ShoppingCartIngredient, ShoppingCartIngredientAdmin)
 admin.site.register(Follow, FollowAdmin)
 admin.site.register(Tag)
 admin.site.register(RecipeIngredient, RecipeIngredientAdmin)
@@ -0,0 +1,91 @@
+import atexit
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from .models import Recipe
+
+FAVORITES = 'favorites_count'
+IN_CARTS = 'in_carts_count'
+
+
+def apply_deltas(deltas):
+    """Записывает приращения {(поле, id рецепта): delta} в базу, по одному
+    UPDATE на каждый набор одинаковых приращений."""
+    by_recipe = defaultdict(dict)
+    for (field, recipe_id), delta in deltas.items():
+        if delta:
+            by_recipe[recipe_id][field] = delta
+    groups = defaultdict(list)
+    for recipe_id, changes in by_recipe.items():
+        groups[tuple(sorted(changes.items()))].append(recipe_id)
+    for changes, recipe_ids in groups.items():
+        Recipe.objects.filter(pk__in=recipe_ids).update(**{
+            field: Greatest(F(field) + delta, 0)
+            for field, delta in changes
+        })
+
+
+class CounterBuffer:
+    """Копит приращения счётчиков рецептов в памяти процесса.
+
+    Приращения одного рецепта складываются, а запись в базу
+    выполняется пачкой: когда накопилось RECIPE_COUNTERS_FLUSH_SIZE
+    изменений, по таймеру раз в RECIPE_COUNTERS_FLUSH_INTERVAL секунд
+    и при завершении процесса. Расхождения, возможные при аварийном
+    завершении, исправляет команда reconcile_recipe_counters.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._deltas = defaultdict(int)
+        self._timer = None
+
+    def add(self, field, recipe_ids, delta):
+        with self._lock:
+            for recipe_id in recipe_ids:
+                self._deltas[(field, recipe_id)] += delta
+            full = len(self._deltas) >= settings.RECIPE_COUNTERS_FLUSH_SIZE
+            if not full and self._timer is None:
+                self._timer = threading.Timer(
+                    settings.RECIPE_COUNTERS_FLUSH_INTERVAL,
+                    self.flush_in_background)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            deltas, self._deltas = self._deltas, defaultdict(int)
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if deltas:
+            apply_deltas(deltas)
+
+    def flush_in_background(self):
+        try:
+            self.flush()
+        finally:
+            connection.close()
+
+
+buffer = CounterBuffer()
+atexit.register(buffer.flush)
+
+
+def change_counter(field, recipe_ids, delta):
+    """Меняет счётчик рецептов сразу через F() в текущей транзакции
+    или, если включена настройка RECIPE_COUNTERS_BUFFERED, через буфер
+    после её фиксации."""
+    if settings.RECIPE_COUNTERS_BUFFERED:
+        recipe_ids = list(recipe_ids)
+        transaction.on_commit(
+            lambda: buffer.add(field, recipe_ids, delta))
+    else:
+        apply_deltas({(field, recipe_id): delta for recipe_id in recipe_ids})
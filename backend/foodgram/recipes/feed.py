@@ -0,0 +1,141 @@
+import heapq
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, models, transaction
+
+from .models import FeedItem, Follow, Recipe
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix='feed-fanout')
+
+
+def insert_feed_items(queryset, user_id, recipe_id, author_id, pub_date):
+    """Вставляет в ленты строки (user_id, recipe_id, author_id, pub_date),
+    вычисленные выражениями по queryset, одним INSERT ... SELECT,
+    пропуская уже существующие. Возвращает число вставленных строк."""
+    rows = queryset.annotate(
+        feed_user_id=user_id,
+        feed_recipe_id=recipe_id,
+        feed_author_id=author_id,
+        feed_pub_date=pub_date,
+    ).values_list(
+        'feed_user_id', 'feed_recipe_id', 'feed_author_id', 'feed_pub_date')
+    select, params = rows.query.get_compiler(
+        connection=connection).as_sql()
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(FeedItem._meta.db_table)} '
+            f'(user_id, recipe_id, author_id, pub_date) {select} '
+            f'ON CONFLICT (user_id, recipe_id) DO NOTHING',
+            params
+        )
+        return cursor.rowcount
+
+
+def fan_out(recipe_id):
+    """Рассылает рецепт в ленты подписчиков автора пачками
+    по FEED_FANOUT_BATCH_SIZE. Рецепты авторов, у которых больше
+    FEED_FANOUT_MAX_FOLLOWERS подписчиков, не рассылаются: лента
+    читает их напрямую. Возвращает число подписчиков, которым
+    рецепт разослан.
+
+    Каждая пачка вставляется запросом к подпискам, поэтому рецепт
+    не попадает в ленту того, кто успел отписаться. Подписавшимся
+    во время рассылки рецепт добавляет backfill."""
+    recipe = Recipe.objects.filter(pk=recipe_id).values(
+        'author_id', 'pub_date').first()
+    if recipe is None:
+        return 0
+    followers = Follow.objects.filter(
+        author_id=recipe['author_id']).order_by('user_id')
+    limit = settings.FEED_FANOUT_MAX_FOLLOWERS
+    if followers[:limit + 1].count() > limit:
+        return 0
+    size = settings.FEED_FANOUT_BATCH_SIZE
+    sent = 0
+    last_user_id = 0
+    while True:
+        bound = list(followers.filter(user_id__gt=last_user_id).values_list(
+            'user_id', flat=True)[size - 1:size])
+        batch = followers.order_by().filter(user_id__gt=last_user_id)
+        if bound:
+            batch = batch.filter(user_id__lte=bound[0])
+        sent += insert_feed_items(
+            batch,
+            user_id=models.F('user_id'),
+            recipe_id=models.Value(recipe_id),
+            author_id=models.Value(recipe['author_id']),
+            pub_date=models.Value(
+                recipe['pub_date'], output_field=models.DateTimeField()),
+        )
+        if not bound:
+            break
+        last_user_id = bound[0]
+    Recipe.objects.filter(pk=recipe_id).update(in_timelines=True)
+    return sent
+
+
+def run_in_worker(recipe_id):
+    try:
+        fan_out(recipe_id)
+    except Exception:
+        logger.exception('Could not fan out recipe %s', recipe_id)
+    finally:
+        connection.close()
+
+
+def schedule_fan_out(recipe):
+    """Рассылает рецепт в фоне после фиксации транзакции. До окончания
+    рассылки рецепт попадает в ленты через чтение напрямую."""
+    transaction.on_commit(lambda: executor.submit(run_in_worker, recipe.pk))
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика последние FEED_BACKFILL_SIZE
+    рецептов автора, если подписка ещё существует. Сюда входят
+    и рецепты, рассылка которых ещё идёт: пачка с этим
+    подписчиком могла быть отправлена до подписки."""
+    recipes = Recipe.objects.filter(
+        models.Exists(Follow.objects.filter(
+            user_id=user_id, author_id=author_id)),
+        author_id=author_id,
+    ).order_by('-pub_date', '-id')[:settings.FEED_BACKFILL_SIZE]
+    insert_feed_items(
+        recipes,
+        user_id=models.Value(user_id),
+        recipe_id=models.F('id'),
+        author_id=models.F('author_id'),
+        pub_date=models.F('pub_date'),
+    )
+
+
+def read_feed(user, limit, position=None):
+    """Последние рецепты ленты пользователя [(pub_date, id), ...]
+    старше позиции position = (pub_date, id).
+
+    Разосланные рецепты читаются диапазоном из FeedItem по индексу
+    (user, pub_date), остальные (у популярных авторов или ещё
+    не разосланные) — из рецептов подписок по частичному индексу,
+    после чего обе части сливаются."""
+    timeline = FeedItem.objects.filter(user=user)
+    pulled = Recipe.objects.filter(
+        in_timelines=False,
+        author__in=Follow.objects.filter(user=user).values('author'))
+    if position is not None:
+        pub_date, pk = position
+        timeline = timeline.filter(
+            models.Q(pub_date__lt=pub_date)
+            | models.Q(pub_date=pub_date, recipe_id__lt=pk))
+        pulled = pulled.filter(
+            models.Q(pub_date__lt=pub_date)
+            | models.Q(pub_date=pub_date, pk__lt=pk))
+    entries = set(timeline.order_by('-pub_date', '-recipe_id').values_list(
+        'pub_date', 'recipe_id')[:limit])
+    entries.update(pulled.order_by('-pub_date', '-id').values_list(
+        'pub_date', 'id')[:limit])
+    return heapq.nlargest(limit, entries)
@@ -0,0 +1,121 @@
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import Recipe
+from .storage import image_storage
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.RECIPE_IMAGE_WORKERS,
+    thread_name_prefix='recipe-images'
+)
+
+
+def variant_name(name, variant):
+    """Путь варианта изображения рядом с оригиналом:
+    recipes/images/temp.jpg -> recipes/images/variants/temp_jpg_medium.webp
+    Расширение оригинала входит в имя, чтобы у temp.jpg и temp.png
+    были разные варианты."""
+    directory, filename = posixpath.split(name)
+    stem = filename.replace('.', '_')
+    return posixpath.join(directory, 'variants', f'{stem}_{variant}.webp')
+
+
+def build_variants(name):
+    """Создаёт уменьшенные WebP-варианты изображения."""
+    with image_storage.open(name) as file:
+        original = ImageOps.exif_transpose(Image.open(file))
+        original = original.convert(
+            'RGBA' if 'A' in original.getbands() else 'RGB')
+    for variant, width in settings.RECIPE_IMAGE_VARIANTS.items():
+        image = original.copy()
+        image.thumbnail((width, width * 4))
+        buffer = BytesIO()
+        image.save(buffer, 'WEBP', quality=settings.RECIPE_IMAGE_QUALITY)
+        target = variant_name(name, variant)
+        if default_storage.exists(target):
+            default_storage.delete(target)
+        default_storage.save(target, ContentFile(buffer.getvalue()))
+
+
+def has_variants(name):
+    return all(default_storage.exists(variant_name(name, variant))
+               for variant in settings.RECIPE_IMAGE_VARIANTS)
+
+
+def process_recipe_image(recipe_id, force=False):
+    """Строит варианты изображения рецепта и отмечает их готовность,
+    если за это время изображение не заменили. Имена изображений
+    определяются содержимым, поэтому для уже загруженной ранее
+    картинки готовые варианты используются повторно."""
+    name = Recipe.objects.filter(pk=recipe_id).values_list(
+        'image', flat=True).first()
+    if not name:
+        return False
+    if force or not has_variants(name):
+        build_variants(name)
+    return bool(Recipe.objects.filter(pk=recipe_id, image=name).update(
+        has_image_variants=True))
+
+
+def run_in_worker(recipe_id):
+    try:
+        process_recipe_image(recipe_id)
+    except Exception:
+        logger.exception('Could not build image variants of recipe %s',
+                         recipe_id)
+    finally:
+        connection.close()
+
+
+def delete_unreferenced(name, deadline):
+    """Удаляет файл хранилища изображений, если он не менялся
+    после deadline и на него не ссылается ни один рецепт. Проверка
+    и удаление идут под блокировкой хранилища: файл, который сейчас
+    используется повторно, получает свежее время изменения
+    и не удаляется, пока ссылка на него не сохранена в базе."""
+    with image_storage.lock():
+        if (not image_storage.exists(name)
+                or image_storage.get_modified_time(name) > deadline
+                or Recipe.objects.filter(image=name).exists()):
+            return False
+        image_storage.delete(name)
+    return True
+
+
+def delete_image(name):
+    """Удаляет изображение и его варианты, если на него больше
+    не ссылается ни один рецепт. Изображения моложе
+    RECIPE_IMAGE_MIN_AGE секунд остаются для collect_image_garbage."""
+    deadline = timezone.now() - timedelta(
+        seconds=settings.RECIPE_IMAGE_MIN_AGE)
+    if not name or not delete_unreferenced(name, deadline):
+        return False
+    for variant in settings.RECIPE_IMAGE_VARIANTS:
+        default_storage.delete(variant_name(name, variant))
+    return True
+
+
+def release_image(name):
+    """Удаляет освободившееся изображение после фиксации транзакции."""
+    if name:
+        transaction.on_commit(lambda: delete_image(name))
+
+
+def schedule_image_variants(recipe):
+    """Передаёт обработку изображения в пул потоков после фиксации
+    транзакции, не задерживая ответ на создание рецепта."""
+    if recipe.image:
+        transaction.on_commit(
+            lambda: executor.submit(run_in_worker, recipe.pk))
@@ -0,0 +1,27 @@
+from django.core.management import BaseCommand
+from recipes.images import process_recipe_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Создаёт уменьшенные WebP-варианты изображений рецептов, '
+            'для которых они ещё не готовы (или для всех с --all).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересоздать варианты для всех рецептов')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(has_image_variants=False)
+        built = 0
+        for recipe_id in recipes.values_list('pk', flat=True).iterator():
+            try:
+                built += process_recipe_image(
+                    recipe_id, force=options['all'])
+            except OSError as error:
+                self.stderr.write(f'Recipe {recipe_id}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Built image variants for {built} recipes'))
@@ -0,0 +1,59 @@
+import posixpath
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.utils import timezone
+from recipes.images import delete_unreferenced, variant_name
+from recipes.models import Recipe
+from recipes.storage import image_storage
+
+IMAGES_DIR = Recipe._meta.get_field('image').upload_to.rstrip('/')
+
+
+def walk(directory):
+    """Все файлы каталога хранилища и его подкаталогов."""
+    directories, files = image_storage.listdir(directory)
+    for name in files:
+        yield posixpath.join(directory, name)
+    for name in directories:
+        yield from walk(posixpath.join(directory, name))
+
+
+class Command(BaseCommand):
+    help = ('Удаляет изображения рецептов и их варианты, на которые '
+            'не ссылается ни один рецепт.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age', type=int, default=60,
+            help='Не трогать файлы моложе указанного числа минут, '
+                 'чтобы не удалить изображения ещё не сохранённых рецептов')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, какие файлы будут удалены')
+
+    def handle(self, *args, **options):
+        if not image_storage.exists(IMAGES_DIR):
+            return
+        referenced = set(Recipe.objects.exclude(image='').values_list(
+            'image', flat=True))
+        referenced |= {variant_name(name, variant)
+                       for name in referenced
+                       for variant in settings.RECIPE_IMAGE_VARIANTS}
+        deadline = timezone.now() - timedelta(minutes=options['min_age'])
+        deleted = freed = 0
+        for name in walk(IMAGES_DIR):
+            if (name in referenced
+                    or image_storage.get_modified_time(name) > deadline):
+                continue
+            size = image_storage.size(name)
+            if options['dry_run']:
+                self.stdout.write(name)
+            elif not delete_unreferenced(name, deadline):
+                continue
+            deleted += 1
+            freed += size
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Would delete" if options["dry_run"] else "Deleted"} '
+            f'{deleted} unreferenced files, {freed / 1024 / 1024:.1f} MB'))
@@ -0,0 +1,17 @@
+from django.core.management import BaseCommand
+from recipes.feed import fan_out
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Рассылает в ленты подписчиков рецепты, которые ещё '
+            'не разосланы (например, опубликованные до появления лент).')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.filter(in_timelines=False).values_list(
+            'pk', flat=True)
+        sent = 0
+        for recipe_id in recipes.iterator():
+            sent += fan_out(recipe_id)
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {sent} feed items'))
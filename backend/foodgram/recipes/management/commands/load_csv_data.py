@@ -1,37 +1,108 @@
 import csv
+import io
+import json
+import time
+from itertools import islice
+from pathlib import Path
 
-from django.core.management import BaseCommand
+from api.cache import bump_reference_version
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
 from recipes.models import Ingredient
 
-MODELS = [Ingredient]
-
-ALREDY_LOADED_ERROR_MESSAGE = """
-If you need to reload the csv data from the CSV file,
-first delete the db.sqlite3 file to destroy the database.
-Then, run `python manage.py migrate` for a new empty
-database with tables"""
+DEFAULT_PATH = Path(settings.BASE_DIR) / 'data' / 'ingredients.csv'
+FIELDS = ('name', 'measurement_unit')
 
 
 class Command(BaseCommand):
-    help = 'Loads data from csv files'
+    help = ('Загружает ингредиенты из CSV или JSON файлов. Уже существующие '
+            'ингредиенты пропускаются, поэтому команду можно запускать '
+            'повторно на заполненной базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*', default=[DEFAULT_PATH],
+            help='Файлы .csv (с заголовком name,measurement_unit) или .json')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество строк в одной пачке вставки')
 
     def handle(self, *args, **options):
-        for Model in MODELS:
-            if Model.objects.exists():
-                print('category data already loaded...exiting.')
-                print(ALREDY_LOADED_ERROR_MESSAGE)
-                return
-        print('Loading category data')
-        handle_ingredients()
-
-
-def handle_ingredients():
-    with open(('data/ingredients.csv'), mode='r') as file:
-        reader = csv.reader(file)
-        header = next(reader)
-        for row in reader:
-            object_dict = {
-                key: value
-                for key, value in zip(header, row)
-            }
-            Ingredient.objects.create(**object_dict)
+        start = time.perf_counter()
+        before = Ingredient.objects.count()
+        read = 0
+        with transaction.atomic():
+            loader = (copy_batches if connection.vendor == 'postgresql'
+                      else insert_batches)
+            for path in options['paths']:
+                rows = read_rows(Path(path))
+                for batch in batches(rows, options['batch_size']):
+                    loader(batch)
+                    read += len(batch)
+            bump_reference_version(Ingredient)
+        inserted = Ingredient.objects.count() - before
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Read {read} rows, inserted {inserted} new ingredients, '
+            f'skipped {read - inserted} in {elapsed:.2f} s '
+            f'({read / elapsed:.0f} rows/s)'))
+
+
+def read_rows(path):
+    """Построчно читает пары (название, единица измерения) из файла."""
+    if not path.exists():
+        raise CommandError(f'File {path} does not exist')
+    with open(path, encoding='utf-8') as file:
+        if path.suffix == '.json':
+            records = json.load(file)
+        elif path.suffix == '.csv':
+            records = csv.DictReader(file)
+        else:
+            raise CommandError(f'Unsupported file format: {path.suffix}')
+        for record in records:
+            row = tuple(record[field].strip() for field in FIELDS)
+            if all(row):
+                yield row
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def insert_batches(batch):
+    Ingredient.objects.bulk_create(
+        (Ingredient(name=name, measurement_unit=measurement_unit)
+         for name, measurement_unit in batch),
+        ignore_conflicts=True
+    )
+
+
+def copy_batches(batch):
+    """PostgreSQL: COPY пачки во временную таблицу и перенос новых строк
+    с пропуском конфликтов по unique_name_measurement_unit."""
+    table = Ingredient._meta.db_table
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(batch)
+    buffer.seek(0)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMP TABLE IF NOT EXISTS ingredient_staging '
+            '(name varchar(200), measurement_unit varchar(200)) '
+            'ON COMMIT DROP'
+        )
+        cursor.copy_expert(
+            'COPY ingredient_staging (name, measurement_unit) '
+            'FROM STDIN WITH (FORMAT csv)', buffer)
+        cursor.execute(
+            f'INSERT INTO {table} (name, measurement_unit) '
+            f'SELECT DISTINCT name, measurement_unit FROM ingredient_staging '
+            f'ON CONFLICT ON CONSTRAINT unique_name_measurement_unit '
+            f'DO NOTHING'
+        )
+        cursor.execute('TRUNCATE ingredient_staging')
@@ -0,0 +1,51 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from recipes.models import ShoppingCartIngredient
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает итоги списков покупок по корзинам '
+            'или, с флагом --verify, только сверяет их')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Только сравнить итоги с исходными таблицами')
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            self.verify()
+            return
+        with transaction.atomic():
+            ShoppingCartIngredient.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {ShoppingCartIngredient.objects.count()} rows'))
+
+    def verify(self):
+        expected = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount
+            in ShoppingCartIngredient.objects.calculate()
+        }
+        actual = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount
+            in ShoppingCartIngredient.objects.values_list(
+                'user_id', 'ingredient_id', 'amount')
+        }
+        mismatches = [
+            (key, actual.get(key), expected.get(key))
+            for key in expected.keys() | actual.keys()
+            if actual.get(key) != expected.get(key)
+        ]
+        for (user_id, ingredient_id), stored, calculated in sorted(
+                mismatches):
+            self.stdout.write(
+                f'user {user_id}, ingredient {ingredient_id}: '
+                f'stored {stored}, expected {calculated}')
+        if mismatches:
+            raise CommandError(
+                f'{len(mismatches)} shopping cart totals are out of date, '
+                f'run the command without --verify to rebuild them')
+        self.stdout.write(self.style.SUCCESS(
+            f'All {len(actual)} shopping cart totals are up to date'))
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management import BaseCommand
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает trending_score рецептов для сортировки '
+            '?ordering=trending. Запускается периодически, например '
+            'из cron каждые несколько минут.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        scored = Recipe.objects.all().recompute_trending()
+        self.stdout.write(self.style.SUCCESS(
+            f'Recomputed trending scores of {scored} recipes '
+            f'in {time.perf_counter() - start:.2f} s'))
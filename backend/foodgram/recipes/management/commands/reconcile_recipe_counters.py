@@ -0,0 +1,14 @@
+from django.core.management import BaseCommand
+from recipes.counters import buffer
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Сверяет счётчики избранного и корзин у рецептов с таблицами '
+            'Favourite и ShoppingCart и исправляет расхождения.')
+
+    def handle(self, *args, **options):
+        buffer.flush()
+        fixed = Recipe.objects.reconcile_counters()
+        self.stdout.write(self.style.SUCCESS(
+            f'Fixed counters of {fixed} recipes'))
@@ -0,0 +1,12 @@
+from django.core.management import BaseCommand
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает поисковые векторы всех рецептов, например '
+            'после массовой загрузки данных в обход API.')
+
+    def handle(self, *args, **options):
+        updated = Recipe.objects.all().update_search_vectors()
+        self.stdout.write(self.style.SUCCESS(
+            f'Updated search vectors of {updated} recipes'))
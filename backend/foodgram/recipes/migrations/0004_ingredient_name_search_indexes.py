@@ -0,0 +1,45 @@
+from django.db import DatabaseError, migrations, transaction
+
+PREFIX_INDEX = 'recipes_ingredient_name_upper_like'
+TRIGRAM_INDEX = 'recipes_ingredient_name_upper_trgm'
+
+
+def create_indexes(apps, schema_editor):
+    """Индексы для поиска ингредиентов по названию в PostgreSQL:
+    name__istartswith компилируется в UPPER(name) LIKE 'X%',
+    name__icontains - в UPPER(name) LIKE '%X%'."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {PREFIX_INDEX} '
+        f'ON recipes_ingredient (UPPER(name::text) text_pattern_ops)'
+    )
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS {TRIGRAM_INDEX} '
+                f'ON recipes_ingredient '
+                f'USING gin (UPPER(name::text) gin_trgm_ops)'
+            )
+    except DatabaseError:
+        # Нет прав на установку pg_trgm: остаётся только префиксный индекс.
+        pass
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {TRIGRAM_INDEX}')
+    schema_editor.execute(f'DROP INDEX IF EXISTS {PREFIX_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_shoppingcartingredient'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
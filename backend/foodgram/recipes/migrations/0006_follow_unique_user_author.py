@@ -0,0 +1,26 @@
+# Generated by Django 3.2.16 on 2026-10-18 05:49
+
+from django.db import migrations, models
+
+
+def delete_duplicate_follows(apps, schema_editor):
+    Follow = apps.get_model('recipes', 'Follow')
+    first_ids = Follow.objects.values('user', 'author').annotate(
+        first_id=models.Min('id')).values('first_id')
+    Follow.objects.exclude(id__in=first_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_pub_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            delete_duplicate_follows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_user_author'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 3.2.16 on 2026-10-18 05:51
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(apps, model_name):
+    model = apps.get_model('recipes', model_name)
+    return Coalesce(
+        models.Subquery(
+            model.objects.filter(
+                recipe=models.OuterRef('pk')
+            ).order_by().values('recipe').annotate(
+                count=models.Count('id')
+            ).values('count'),
+            output_field=models.IntegerField()
+        ),
+        0
+    )
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.update(
+        favorites_count=count_subquery(apps, 'Favourite'),
+        in_carts_count=count_subquery(apps, 'ShoppingCart'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_follow_unique_user_author'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавлений в избранное'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавлений в список покупок'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 3.2.16 on 2026-10-18 05:53
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def delete_duplicates(model):
+    first_ids = model.objects.values('user', 'recipe').annotate(
+        first_id=models.Min('id')).values('first_id')
+    return model.objects.exclude(id__in=first_ids).delete()[0]
+
+
+def count_subquery(model):
+    return Coalesce(
+        models.Subquery(
+            model.objects.filter(
+                recipe=models.OuterRef('pk')
+            ).order_by().values('recipe').annotate(
+                count=models.Count('id')
+            ).values('count'),
+            output_field=models.IntegerField()
+        ),
+        0
+    )
+
+
+def delete_duplicate_relations(apps, schema_editor):
+    """Удаляет повторы и пересчитывает зависящие от них
+    счётчики рецептов и итоги списков покупок."""
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Favourite = apps.get_model('recipes', 'Favourite')
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingCartIngredient = apps.get_model(
+        'recipes', 'ShoppingCartIngredient')
+    deleted_favourites = delete_duplicates(Favourite)
+    deleted_carts = delete_duplicates(ShoppingCart)
+    if deleted_favourites or deleted_carts:
+        Recipe.objects.update(
+            favorites_count=count_subquery(Favourite),
+            in_carts_count=count_subquery(ShoppingCart),
+        )
+    if deleted_carts:
+        ShoppingCartIngredient.objects.all().delete()
+        totals = RecipeIngredient.objects.filter(
+            recipe__shopping_cart__isnull=False
+        ).values(
+            'ingredient_id',
+            cart_user_id=models.F('recipe__shopping_cart__user')
+        ).annotate(
+            total_amount=models.Sum('amount')
+        ).order_by()
+        ShoppingCartIngredient.objects.bulk_create(
+            ShoppingCartIngredient(
+                user_id=total['cart_user_id'],
+                ingredient_id=total['ingredient_id'],
+                amount=total['total_amount'])
+            for total in totals
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_ordering_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            delete_duplicate_relations, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='favourite',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_favourite_user_recipe'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcart',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_shopping_cart_user_recipe'),
+        ),
+    ]
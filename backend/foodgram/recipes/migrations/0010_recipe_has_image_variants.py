@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-18 05:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_unique_favourite_shopping_cart'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='has_image_variants',
+            field=models.BooleanField(default=False, editable=False, help_text='Уменьшенные WebP-копии изображения созданы', verbose_name='Варианты изображения готовы'),
+        ),
+    ]
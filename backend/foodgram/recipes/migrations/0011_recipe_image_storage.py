@@ -0,0 +1,19 @@
+# Generated by Django 3.2.16 on 2026-10-18 05:59
+
+import recipes.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_has_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(storage=recipes.storage.ContentAddressedStorage(), upload_to='recipes/images/'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 3.2.16 on 2026-10-18 06:06
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_INDEX = 'recipe_search_vector_idx'
+
+
+def create_index(apps, schema_editor):
+    """GIN-индекс по search_vector и заполнение вектора для уже
+    существующих рецептов. Только для PostgreSQL: на остальных СУБД
+    поиск работает без вектора."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {SEARCH_INDEX} '
+        f'ON recipes_recipe USING gin (search_vector)'
+    )
+    schema_editor.execute(
+        "UPDATE recipes_recipe r SET search_vector = "
+        "setweight(to_tsvector('russian', r.name), 'A') || "
+        "setweight(to_tsvector('russian', COALESCE(("
+        "SELECT string_agg(i.name, ' ') "
+        "FROM recipes_recipeingredient ri "
+        "JOIN recipes_ingredient i ON i.id = ri.ingredient_id "
+        "WHERE ri.recipe_id = r.id), '')), 'B') || "
+        "setweight(to_tsvector('russian', r.text), 'C')"
+    )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {SEARCH_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, help_text='Название, ингредиенты и описание для ?search=', null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
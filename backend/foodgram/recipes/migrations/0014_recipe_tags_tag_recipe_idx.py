@@ -0,0 +1,22 @@
+from django.db import migrations
+
+TAG_RECIPE_INDEX = 'recipes_recipe_tags_tag_recipe_idx'
+
+
+class Migration(migrations.Migration):
+    """Индекс (tag_id, recipe_id) на таблице связи рецептов и тэгов:
+    фильтр ?tags= находит рецепты тэга, читая только индекс.
+    Таблица создаётся ManyToManyField автоматически, поэтому индекс
+    задаётся SQL, а не в Meta."""
+
+    dependencies = [
+        ('recipes', '0013_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            f'CREATE INDEX IF NOT EXISTS {TAG_RECIPE_INDEX} '
+            f'ON recipes_recipe_tags (tag_id, recipe_id)',
+            f'DROP INDEX IF EXISTS {TAG_RECIPE_INDEX}',
+        ),
+    ]
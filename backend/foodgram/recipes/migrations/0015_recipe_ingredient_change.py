@@ -0,0 +1,25 @@
+# Generated by Django 3.2.16 on 2026-10-18 06:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_recipe_tags_tag_recipe_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeIngredientChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe_id', models.BigIntegerField(help_text='Рецепт мог быть уже удалён', verbose_name='id рецепта')),
+            ],
+            options={
+                'verbose_name': 'Изменение состава рецепта',
+                'verbose_name_plural': 'Изменения составов рецептов',
+                'ordering': ('id',),
+            },
+        ),
+    ]
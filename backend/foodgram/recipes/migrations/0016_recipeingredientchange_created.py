@@ -0,0 +1,20 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_recipe_ingredient_change'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipeingredientchange',
+            name='created',
+            field=models.DateTimeField(
+                auto_now_add=True, default=django.utils.timezone.now,
+                verbose_name='Время изменения'),
+            preserve_default=False,
+        ),
+    ]
@@ -1,6 +1,17 @@
-from django.db import models
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector, SearchVectorField)
+from django.db import connection, connections, models
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, RowNumber, TruncHour
+from django.utils import timezone
 from user.models import User
 
+from .storage import image_storage
 from .validators import amount_validate, time_validate
 
 
@@ -53,6 +64,164 @@ class Ingredient(models.Model):
         return self.name
 
 
+def count_subquery(model):
+    """Количество строк model, ссылающихся на рецепт из внешнего запроса."""
+    return Coalesce(
+        models.Subquery(
+            model.objects.filter(
+                recipe=models.OuterRef('pk')
+            ).order_by().values('recipe').annotate(
+                count=models.Count('id')
+            ).values('count'),
+            output_field=models.IntegerField()
+        ),
+        0
+    )
+
+
+class RecipeQuerySet(models.QuerySet):
+    """Набор запросов для рецептов"""
+
+    def with_related(self):
+        """Подгружает автора, тэги и ингредиенты фиксированным
+        числом запросов независимо от количества рецептов."""
+        return self.select_related('author').prefetch_related(
+            'tags',
+            models.Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient')
+            )
+        )
+
+    def with_user_flags(self, user):
+        """Аннотирует рецепты флагами is_favorited
+        и is_in_shopping_cart для текущего пользователя."""
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=models.Value(
+                    False, output_field=models.BooleanField()),
+                is_in_shopping_cart=models.Value(
+                    False, output_field=models.BooleanField()),
+            )
+        return self.annotate(
+            is_favorited=models.Exists(Favourite.objects.filter(
+                user=user, recipe=models.OuterRef('pk'))),
+            is_in_shopping_cart=models.Exists(ShoppingCart.objects.filter(
+                user=user, recipe=models.OuterRef('pk'))),
+        )
+
+    def reconcile_counters(self):
+        """Пересчитывает favorites_count и in_carts_count по таблицам
+        избранного и корзин, возвращает число исправленных рецептов."""
+        actual = {
+            'favorites_count': count_subquery(Favourite),
+            'in_carts_count': count_subquery(ShoppingCart),
+        }
+        stale = self.annotate(
+            actual_favorites=actual['favorites_count'],
+            actual_in_carts=actual['in_carts_count'],
+        ).exclude(
+            favorites_count=models.F('actual_favorites'),
+            in_carts_count=models.F('actual_in_carts'),
+        )
+        return self.model.objects.filter(
+            pk__in=list(stale.values_list('pk', flat=True))
+        ).update(**actual)
+
+    def recompute_trending(self, now=None):
+        """Пересчитывает trending_score: добавления в избранное и корзины
+        за последние TRENDING_WINDOW_DAYS дней с весом, убывающим вдвое
+        каждые TRENDING_HALF_LIFE_HOURS часов. Добавления группируются
+        по часам, поэтому база отдаёт агрегаты, а не отдельные строки."""
+        now = now or timezone.now()
+        since = now - timedelta(days=settings.TRENDING_WINDOW_DAYS)
+        half_life = settings.TRENDING_HALF_LIFE_HOURS * 3600
+        scores = defaultdict(float)
+        for model in (Favourite, ShoppingCart):
+            buckets = model.objects.filter(
+                pub_date__gte=since, recipe__in=self
+            ).annotate(
+                hour=TruncHour('pub_date')
+            ).order_by().values('recipe', 'hour').annotate(
+                count=models.Count('id')
+            ).values_list('recipe', 'hour', 'count')
+            for recipe_id, hour, count in buckets.iterator():
+                age = max((now - hour).total_seconds(), 0)
+                scores[recipe_id] += count * 0.5 ** (age / half_life)
+        self.exclude(pk__in=list(scores)).exclude(
+            trending_score=0).update(trending_score=0)
+        self.model.objects.bulk_update(
+            [self.model(pk=pk, trending_score=score)
+             for pk, score in scores.items()],
+            ['trending_score'],
+            batch_size=1000
+        )
+        return len(scores)
+
+    def search(self, value):
+        """Рецепты, в названии, описании или ингредиентах которых
+        встречаются слова запроса, с релевантностью search_rank.
+
+        В PostgreSQL поиск идёт по search_vector через GIN-индекс
+        с учётом морфологии; на остальных СУБД — вхождением подстроки,
+        и рецепты с совпадением в названии считаются релевантнее."""
+        if connections[self.db].vendor != 'postgresql':
+            return self.filter(
+                models.Q(name__icontains=value)
+                | models.Q(text__icontains=value)
+                | models.Q(models.Exists(RecipeIngredient.objects.filter(
+                    recipe=models.OuterRef('pk'),
+                    ingredient__name__icontains=value)))
+            ).annotate(search_rank=models.Case(
+                models.When(name__icontains=value, then=models.Value(1.0)),
+                default=models.Value(0.0),
+                output_field=models.FloatField()
+            ))
+        query = SearchQuery(value, config=settings.RECIPE_SEARCH_CONFIG,
+                            search_type='websearch')
+        return self.filter(search_vector=query).annotate(
+            search_rank=SearchRank(models.F('search_vector'), query))
+
+    def update_search_vectors(self):
+        """Пересчитывает search_vector по названию (вес A), названиям
+        ингредиентов (B) и описанию (C). Вне PostgreSQL ничего не делает."""
+        if connections[self.db].vendor != 'postgresql':
+            return 0
+        config = settings.RECIPE_SEARCH_CONFIG
+        ingredient_names = models.Subquery(
+            RecipeIngredient.objects.filter(
+                recipe=models.OuterRef('pk')
+            ).order_by().values('recipe').annotate(
+                names=StringAgg('ingredient__name', ' ')
+            ).values('names'),
+            output_field=models.TextField()
+        )
+        return self.update(search_vector=(
+            SearchVector('name', weight='A', config=config)
+            + SearchVector(ingredient_names, weight='B', config=config)
+            + SearchVector('text', weight='C', config=config)
+        ))
+
+    def latest_per_author(self, limit):
+        """Не больше limit последних рецептов каждого автора
+        одним запросом с ROW_NUMBER() OVER (PARTITION BY author_id)."""
+        ranked = self.annotate(
+            row_number=models.Window(
+                expression=RowNumber(),
+                partition_by=models.F('author_id'),
+                order_by=(models.F('pub_date').desc(),
+                          models.F('id').desc())
+            )
+        ).order_by().values('id', 'row_number')
+        sql, params = ranked.query.sql_with_params()
+        return self.model.objects.filter(pk__in=RawSQL(
+            f'SELECT ranked.id FROM ({sql}) ranked '
+            f'WHERE ranked.row_number <= %s',
+            (*params, limit)
+        ))
+
+
 class Recipe(models.Model):
     """Класс для описания рецептов"""
     author = models.ForeignKey(
@@ -67,6 +236,13 @@ class Recipe(models.Model):
         help_text='Название рецепта')
     image = models.ImageField(
         upload_to='recipes/images/',
+        storage=image_storage,
+    )
+    has_image_variants = models.BooleanField(
+        'Варианты изображения готовы',
+        default=False,
+        editable=False,
+        help_text='Уменьшенные WebP-копии изображения созданы'
     )
     text = models.TextField(
         verbose_name='Описание',
@@ -94,11 +270,64 @@ class Recipe(models.Model):
         auto_now_add=True,
         help_text='Дата устанавливается автоматически'
     )
+    favorites_count = models.PositiveIntegerField(
+        'Добавлений в избранное',
+        default=0,
+        editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'Добавлений в список покупок',
+        default=0,
+        editable=False
+    )
+    in_timelines = models.BooleanField(
+        'Разослан в ленты подписчиков',
+        default=False,
+        editable=False,
+        help_text='Пока рецепт не разослан, лента читает его напрямую'
+    )
+    trending_score = models.FloatField(
+        'Популярность за последние дни',
+        default=0,
+        editable=False,
+        help_text='Пересчитывается командой recompute_trending'
+    )
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True,
+        editable=False,
+        help_text='Название, ингредиенты и описание для ?search='
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=['-favorites_count', '-id'],
+                name='recipe_popular_idx'
+            ),
+            models.Index(
+                fields=['-trending_score', '-id'],
+                name='recipe_trending_idx'
+            ),
+            models.Index(
+                fields=['cooking_time', 'id'],
+                name='recipe_cooking_time_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_not_in_timelines_idx',
+                condition=models.Q(in_timelines=False)
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['name', 'author'],
@@ -135,6 +364,25 @@ class RecipeIngredient(models.Model):
                 f'{self.ingredient.name}')
 
 
+class RecipeIngredientChange(models.Model):
+    """Журнал изменений состава рецептов: по нему индексы
+    в памяти процессов узнают, какие рецепты обновить.
+    Номер последней записи служит номером версии состава."""
+    recipe_id = models.BigIntegerField(
+        'id рецепта',
+        help_text='Рецепт мог быть уже удалён'
+    )
+    created = models.DateTimeField('Время изменения', auto_now_add=True)
+
+    class Meta:
+        ordering = ('id',)
+        verbose_name = 'Изменение состава рецепта'
+        verbose_name_plural = 'Изменения составов рецептов'
+
+    def __str__(self):
+        return f'Изменён состав рецепта {self.recipe_id}'
+
+
 class Follow(models.Model):
     """Класс для описания системы подписки на авторов"""
     user = models.ForeignKey(
@@ -161,11 +409,62 @@ class Follow(models.Model):
         ordering = ('-pub_date',)
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_user_author'
+            )
+        ]
 
     def __str__(self):
         return f'{self.user} подписан на {self.author}'
 
 
+class FeedItem(models.Model):
+    """Рецепт в ленте подписчика автора. Строки создаются
+    при публикации рецепта (рассылка по подпискам), поэтому
+    лента читается диапазоном по индексу (user, pub_date)."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Подписчик'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор рецепта'
+    )
+    pub_date = models.DateTimeField('Дата публикации рецепта')
+
+    class Meta:
+        ordering = ('-pub_date', '-recipe')
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_user_recipe'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='feed_user_pub_date_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user}'
+
+
 class Favourite(models.Model):
     """Класс для описания системы добавления рецептов в избранное"""
     user = models.ForeignKey(
@@ -192,6 +491,12 @@ class Favourite(models.Model):
         ordering = ('-pub_date',)
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранное'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_favourite_user_recipe'
+            )
+        ]
 
     def __str__(self):
         return f'{self.user} добавил в избранное {self.recipe}'
@@ -223,6 +528,142 @@ class ShoppingCart(models.Model):
         ordering = ('-pub_date',)
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_shopping_cart_user_recipe'
+            )
+        ]
 
     def __str__(self):
         return f'{self.user} добавил в список покупок {self.recipe}'
+
+
+class ShoppingCartIngredientManager(models.Manager):
+    """Поддерживает итоги списков покупок в актуальном состоянии."""
+
+    def apply_recipes(self, recipe_ids, user_id=None, sign=1):
+        """Прибавляет (sign=1) или вычитает (sign=-1) ингредиенты рецептов
+        к итогам списка покупок пользователя. Без user_id изменение
+        применяется ко всем пользователям, у которых рецепты в корзине."""
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return
+        quote = connection.ops.quote_name
+        totals = quote(self.model._meta.db_table)
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        if user_id is None:
+            source = (
+                f'SELECT sc.user_id, ri.ingredient_id, %s * SUM(ri.amount) '
+                f'FROM {quote(RecipeIngredient._meta.db_table)} ri '
+                f'JOIN {quote(ShoppingCart._meta.db_table)} sc '
+                f'ON sc.recipe_id = ri.recipe_id '
+                f'WHERE ri.recipe_id IN ({placeholders}) '
+                f'GROUP BY sc.user_id, ri.ingredient_id'
+            )
+            params = [sign, *recipe_ids]
+        else:
+            source = (
+                f'SELECT %s, ri.ingredient_id, %s * SUM(ri.amount) '
+                f'FROM {quote(RecipeIngredient._meta.db_table)} ri '
+                f'WHERE ri.recipe_id IN ({placeholders}) '
+                f'GROUP BY ri.ingredient_id'
+            )
+            params = [user_id, sign, *recipe_ids]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {totals} (user_id, ingredient_id, amount) '
+                f'{source} '
+                f'ON CONFLICT (user_id, ingredient_id) DO UPDATE '
+                f'SET amount = {totals}.amount + EXCLUDED.amount',
+                params
+            )
+        if sign < 0:
+            empty = self.filter(amount__lte=0)
+            if user_id is not None:
+                empty = empty.filter(user_id=user_id)
+            empty.delete()
+
+    def apply_amounts(self, recipe_id, deltas):
+        """Прибавляет изменения количества ингредиентов рецепта
+        {id ингредиента: разница} к итогам всех пользователей,
+        у которых рецепт в корзине."""
+        deltas = [(pk, delta) for pk, delta in deltas.items() if delta]
+        if not deltas:
+            return
+        quote = connection.ops.quote_name
+        totals = quote(self.model._meta.db_table)
+        values = ', '.join(['(%s, %s)'] * len(deltas))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {totals} (user_id, ingredient_id, amount) '
+                f'SELECT sc.user_id, deltas.column1, deltas.column2 '
+                f'FROM {quote(ShoppingCart._meta.db_table)} sc '
+                f'CROSS JOIN (VALUES {values}) deltas '
+                f'WHERE sc.recipe_id = %s '
+                f'ON CONFLICT (user_id, ingredient_id) DO UPDATE '
+                f'SET amount = {totals}.amount + EXCLUDED.amount',
+                [value for delta in deltas for value in delta] + [recipe_id]
+            )
+        decreased = [pk for pk, delta in deltas if delta < 0]
+        if decreased:
+            self.filter(amount__lte=0, ingredient_id__in=decreased).delete()
+
+    def calculate(self):
+        """Итоги списков покупок, посчитанные по исходным таблицам."""
+        return RecipeIngredient.objects.filter(
+            recipe__shopping_cart__isnull=False
+        ).values(
+            'ingredient_id',
+            cart_user_id=models.F('recipe__shopping_cart__user')
+        ).annotate(
+            total_amount=models.Sum('amount')
+        ).values_list(
+            'cart_user_id', 'ingredient_id', 'total_amount'
+        ).order_by()
+
+    def rebuild(self):
+        self.all().delete()
+        self.bulk_create(
+            self.model(user_id=user_id, ingredient_id=ingredient_id,
+                       amount=amount)
+            for user_id, ingredient_id, amount in self.calculate()
+        )
+
+
+class ShoppingCartIngredient(models.Model):
+    """Класс для описания суммарного количества ингредиента
+    в списке покупок пользователя"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_ingredients',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_totals',
+        verbose_name='Ингредиент'
+    )
+    amount = models.IntegerField(
+        'Количество',
+        help_text='Суммарное количество по всем рецептам из корзины'
+    )
+
+    objects = ShoppingCartIngredientManager()
+
+    class Meta:
+        ordering = ('id',)
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_user_ingredient'
+            )
+        ]
+
+    def __str__(self):
+        return (f'{self.user}: {self.amount} '
+                f'{self.ingredient.measurement_unit} {self.ingredient.name}')
@@ -0,0 +1,57 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+
+from .feed import backfill, schedule_fan_out
+from .images import release_image
+from .models import (FeedItem, Follow, Ingredient, Recipe,
+                     ShoppingCartIngredient)
+
+# Состав рецептов recipe_ids изменился: отправляется после изменения
+# RecipeIngredient в обход сигналов моделей (bulk_create и т. п.)
+recipe_ingredients_changed = Signal()
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_shopping_carts(sender, instance, **kwargs):
+    """Вычитает ингредиенты удаляемого рецепта из списков покупок."""
+    ShoppingCartIngredient.objects.apply_recipes([instance.pk], sign=-1)
+
+
+@receiver(post_delete, sender=Recipe)
+def release_recipe_image(sender, instance, **kwargs):
+    """Удаляет изображение удалённого рецепта, если оно больше
+    не используется другими рецептами."""
+    release_image(instance.image.name)
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_new_recipe(sender, instance, created, **kwargs):
+    """Рассылает новый рецепт в ленты подписчиков автора."""
+    if created:
+        schedule_fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(sender, instance, created, **kwargs):
+    """Добавляет последние рецепты автора в ленту нового подписчика
+    после фиксации подписки."""
+    if created and instance.author_id:
+        transaction.on_commit(
+            lambda: backfill(instance.user_id, instance.author_id))
+
+
+@receiver(post_delete, sender=Follow)
+def clear_feed(sender, instance, **kwargs):
+    """Убирает рецепты автора из ленты отписавшегося пользователя."""
+    FeedItem.objects.filter(
+        user_id=instance.user_id, author_id=instance.author_id).delete()
+
+
+@receiver(post_save, sender=Ingredient)
+def update_recipe_search_vectors(sender, instance, created, **kwargs):
+    """Обновляет поисковые векторы рецептов с переименованным
+    ингредиентом."""
+    if not created:
+        Recipe.objects.filter(
+            ingredients=instance).update_search_vectors()
@@ -0,0 +1,93 @@
+import fcntl
+import hashlib
+import os
+import posixpath
+from contextlib import contextmanager
+from tempfile import NamedTemporaryFile
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+from PIL import Image
+
+# Формат Pillow: расширение сохранённого файла
+EXTENSIONS = {
+    'JPEG': '.jpg',
+    'PNG': '.png',
+    'WEBP': '.webp',
+    'GIF': '.gif',
+}
+LOCK_NAME = '.images.lock'
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, где имя файла — SHA-256 его содержимого.
+
+    recipes/images/temp.png -> recipes/images/3f/3fa1...c9.png.
+    Одинаковые изображения хранятся один раз: если файл с таким
+    хешем уже есть, он не перезаписывается, а его имя возвращается
+    сразу. Содержимое файла под данным именем никогда не меняется,
+    поэтому nginx может отдавать их с immutable-заголовками.
+    Расширение определяется по формату изображения, а не по имени
+    загруженного файла. Неиспользуемые файлы удаляет команда
+    collect_image_garbage.
+    """
+
+    def save(self, name, content, max_length=None):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        directory = posixpath.dirname(name)
+        name = posixpath.join(
+            directory, digest[:2], digest + self.get_extension(content))
+        return super().save(name, content, max_length)
+
+    def get_extension(self, content):
+        content.seek(0)
+        try:
+            image_format = Image.open(content).format
+        except (OSError, Image.DecompressionBombError):
+            image_format = None
+        finally:
+            content.seek(0)
+        if image_format not in EXTENSIONS:
+            raise SuspiciousFileOperation(
+                'Можно сохранить только изображение JPEG, PNG, WebP или GIF.')
+        return EXTENSIONS[image_format]
+
+    def get_available_name(self, name, max_length=None):
+        # Совпадение имён означает совпадение содержимого
+        return name
+
+    @contextmanager
+    def lock(self):
+        """Блокировка между процессами на время проверки и записи
+        или удаления файла."""
+        os.makedirs(self.location, exist_ok=True)
+        with open(os.path.join(self.location, LOCK_NAME), 'a') as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            yield
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        with self.lock():
+            if os.path.exists(full_path):
+                # Свежее время изменения не даёт удалить файл,
+                # пока новая ссылка на него не сохранена в базе
+                os.utime(full_path)
+                return name
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        # Запись во временный файл и атомарное переименование:
+        # параллельные загрузки одного изображения не мешают друг другу
+        with NamedTemporaryFile(dir=directory, delete=False) as temporary:
+            for chunk in content.chunks():
+                temporary.write(chunk)
+        os.chmod(temporary.name, self.file_permissions_mode or 0o644)
+        os.replace(temporary.name, full_path)
+        return name
+
+
+image_storage = ContentAddressedStorage()
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.16 on 2026-10-18 05:49
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0009_user_role'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='user',
+            name='is_subscribed',
+        ),
+    ]
@@ -31,10 +31,6 @@ class User(AbstractUser):
         verbose_name='Фамилия пользователя',
         max_length=150
     )
-    is_subscribed = models.BooleanField(
-        default=False,
-        verbose_name='Статус подписки'
-    )
     role = models.CharField(
         verbose_name='Роль',
         max_length=50,